@@ -0,0 +1,71 @@
+import sys
+import json
+import argparse
+
+from models.studio_model import StudioModel
+from models.exporter import SegmentedExporter, VideoExporter
+from models.pipeline_spec import build_pipeline
+
+
+def parse_background(value):
+    if value.startswith('#'):
+        return {'type': 'color', 'value': value}
+
+    return {'type': 'wallpaper', 'value': int(value)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a screen recording without opening the studio.')
+    parser.add_argument('input', help='video to export')
+    parser.add_argument('output', help='exported video file')
+    parser.add_argument('--aspect-ratio', default='Auto', help='e.g. 16:9, or Auto to keep the video size')
+    parser.add_argument('--padding', type=int, default=100)
+    parser.add_argument('--radius', type=int, default=50, help='corner radius')
+    parser.add_argument('--background', type=parse_background, default='1',
+                        help='#RRGGBB color or wallpaper number')
+    parser.add_argument('--spec', default=None,
+                        help='pipeline spec JSON file with the settings and zoom tracks, replaces the options above')
+    parser.add_argument('--fourcc', default='mp4v', help='codec of the exported video')
+    parser.add_argument('--workers', type=int, default=None, help='compositing threads, defaults to the CPU count up to 4')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='export segments in this many processes, joining them needs ffmpeg')
+    args = parser.parse_args()
+
+    model = StudioModel(args.input, preview=False)
+    if args.spec:
+        with open(args.spec) as file:
+            spec = json.load(file)
+    else:
+        model.update_aspect_ratio(args.aspect_ratio)
+        model.update_padding(args.padding)
+        model.update_border_radius(args.radius)
+        model.update_wallpaper(args.background)
+        spec = model.pipeline_spec()
+
+    def on_progress(frames_done, num_frames):
+        print(f'\rExporting {frames_done}/{num_frames}', end='', file=sys.stderr, flush=True)
+
+    if args.processes:
+        exporter = SegmentedExporter(model.video_path, spec, fourcc=args.fourcc, processes=args.processes)
+    else:
+        transform = build_pipeline(spec, frame_times=model.video_controller.frame_times())
+        exporter = VideoExporter(model.video_path, transform, fourcc=args.fourcc, workers=args.workers)
+
+    try:
+        exporter.export(args.output, on_progress=on_progress)
+    except KeyboardInterrupt:
+        return 1
+    finally:
+        print(file=sys.stderr)
+
+    if not args.processes:
+        # The busiest stage limits the export speed
+        for stage, info in exporter.pipeline_info().items():
+            print(f'{stage}: {info["frames"]} frames, {info["busy"]:.0%} busy on {info["threads"]} thread(s)',
+                  file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
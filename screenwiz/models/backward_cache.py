@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+
+
+class BackwardCache:
+    """Decoded frames before the playhead, for stepping backwards.
+
+    Stepping back one frame at a time would otherwise seek to the previous
+    keyframe and decode up to the frame for every single step. Instead, a run
+    of frames ending at the requested frame is decoded once, starting at the
+    keyframe before it or as far back as half the byte budget allows, and the
+    run before it is decoded on a background thread while the user keeps
+    stepping back.
+    Cached frames are shared and must not be modified.
+    """
+    def __init__(self, video_controller, max_bytes=256 * 1024 * 1024):
+        self.video_controller = video_controller
+        self.index = video_controller.index
+        self.max_bytes = max_bytes
+
+        frame_nbytes = video_controller.frame_width * video_controller.frame_height * 3
+        self.run_length = max(1, max_bytes // 2 // frame_nbytes)
+
+        # First frame of each run -> decoded frames, the most recently used last
+        self.runs = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.prefetch_thread = None
+
+    def get(self, frame_index):
+        with self.lock:
+            start = self._find_run(frame_index)
+            if start is None:
+                self.misses += 1
+                return
+
+            self.runs.move_to_end(start)
+            self.hits += 1
+            return self.runs[start][frame_index - start]
+
+    def step_back(self, frame_index):
+        """Return the given frame, decoding the run that ends at it if needed."""
+        frame = self.get(frame_index)
+        if frame is None and self.prefetch_thread is not None:
+            # The frame may be in the run being prefetched
+            self.prefetch_thread.join()
+            frame = self.get(frame_index)
+
+        if frame is None:
+            frames = self._decode(self._run_start(frame_index), frame_index)
+            if not frames or not self._contains(frame_index):
+                return
+
+            frame = frames[-1]
+
+        self._prefetch(frame_index)
+        return frame
+
+    def clear(self):
+        if self.prefetch_thread is not None:
+            self.prefetch_thread.join()
+
+        with self.lock:
+            self.runs.clear()
+
+    def cache_info(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': sum(len(frames) for frames in self.runs.values()),
+                'nbytes': sum(frame.nbytes for frames in self.runs.values() for frame in frames),
+                'max_nbytes': self.max_bytes,
+            }
+
+    def _find_run(self, frame_index):
+        for start, frames in self.runs.items():
+            if start <= frame_index < start + len(frames):
+                return start
+
+    def _contains(self, frame_index):
+        with self.lock:
+            return self._find_run(frame_index) is not None
+
+    def _run_start(self, end):
+        return max(self.index.keyframe_before(end), end - self.run_length + 1)
+
+    def _decode(self, start, end):
+        frames = []
+        for frame_index in range(start, end + 1):
+            frame = self.video_controller.read_decoded(frame_index)
+            if frame is None:
+                break
+
+            frame.setflags(write=False)
+            frames.append(frame)
+
+        if frames:
+            with self.lock:
+                self.runs[start] = frames
+                # Keep the run being stepped through and the one before it
+                while len(self.runs) > 2:
+                    self.runs.popitem(last=False)
+
+        return frames
+
+    def _prefetch(self, frame_index):
+        if self.prefetch_thread is not None and self.prefetch_thread.is_alive():
+            return
+
+        with self.lock:
+            start = self._find_run(frame_index)
+            if start is None or start == 0 or self._find_run(start - 1) is not None:
+                return
+
+            # Decode the previous run once the playhead is in the first half of this one
+            if frame_index - start > len(self.runs[start]) // 2:
+                return
+
+        end = start - 1
+        self.prefetch_thread = threading.Thread(target=self._decode, args=(self._run_start(end), end), daemon=True)
+        self.prefetch_thread.start()
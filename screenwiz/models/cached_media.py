@@ -0,0 +1,60 @@
+import os
+import threading
+
+from utils.disk_cache import DiskCache
+
+
+class CachedMedia:
+    """A file derived from a video, built on a background thread into the DiskCache.
+
+    Subclasses set kind, the DiskCache directory, and implement build(). A
+    build writes to partial_path() and publishes the file once complete, so
+    only complete files are ever opened. Partial files are left alone by
+    DiskCache.trim() while they are written.
+    """
+    kind = None
+
+    def __init__(self, video_path, tag, extension):
+        self.video_path = video_path
+        self.extension = extension
+        self.path = str(DiskCache.path_for(self.kind, video_path, tag, extension))
+
+        self.progress = 0.0
+        self.thread = None
+        self.cancelled = threading.Event()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def start(self, num_frames, on_ready=None):
+        """Build the file on a background thread, on_ready() is called when done."""
+        self.thread = threading.Thread(target=self._run, args=(num_frames, on_ready), daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def build(self, num_frames):
+        """Write the file, returns whether it completed."""
+        raise NotImplementedError('CachedMedia build method must be implemented.')
+
+    def partial_path(self, name='partial'):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return f'{self.path}.{name}{self.extension}'
+
+    def publish(self, partial_path):
+        os.replace(partial_path, self.path)
+        DiskCache.trim(keep=[self.path])
+        self.progress = 1.0
+
+    def _run(self, num_frames, on_ready):
+        try:
+            completed = self.build(num_frames)
+        except Exception:
+            # The file is only an optimization
+            return
+
+        if completed and on_ready is not None:
+            on_ready()
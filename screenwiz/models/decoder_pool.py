@@ -0,0 +1,188 @@
+import threading
+
+import cv2
+
+
+class Decoder:
+    """A capture on the video and the index of the frame it decodes next."""
+    # Forward gaps up to this many frames are skipped by grabbing frames
+    # instead of seeking, which would re-decode from the previous keyframe
+    max_grab_frames = 15
+
+    # Seeks that land past the target are retried from earlier keyframes
+    max_seek_attempts = 3
+
+    # Extra cost of a seek in decoded frames, for flushing the decoder
+    seek_cost = 2
+
+    def __init__(self, video_path, index=None):
+        self.video_capture = cv2.VideoCapture(video_path)
+        self.index = index
+
+        # Index of the frame decoded next (None when unknown), and whether
+        # that frame was grabbed already by a seek and only has to be retrieved
+        self.decode_position = 0
+        self.grabbed = False
+
+    def read(self, target):
+        """Decode the frame with the given 0-based index."""
+        self._seek(target)
+
+        if self.grabbed:
+            self.grabbed = False
+            ret, frame = self.video_capture.retrieve()
+        else:
+            ret, frame = self.video_capture.read()
+
+        if not ret:
+            self.decode_position = None
+            return
+
+        self.decode_position = target + 1
+        return frame
+
+    def cost(self, target):
+        """Estimate how many frames are decoded to read the given frame."""
+        if self.can_grab(target):
+            return target - self.decode_position
+
+        if self.index is not None:
+            return target - self.index.keyframe_before(target) + self.seek_cost
+
+        return self.max_grab_frames + self.seek_cost
+
+    def release(self):
+        self.video_capture.release()
+
+    def can_grab(self, target):
+        if self.decode_position is None or target < self.decode_position:
+            return False
+
+        if self.index is not None:
+            # Without a keyframe in between, a seek would decode
+            # everything up to the decode position again
+            return self.index.keyframe_before(target) <= self.decode_position
+
+        return target - self.decode_position <= self.max_grab_frames
+
+    def _seek(self, target):
+        if self.decode_position == target:
+            return
+
+        self.grabbed = False
+        if self.can_grab(target) and self._grab_to(target):
+            return
+
+        if self.index is not None and self._seek_keyframe(target):
+            return
+
+        self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+        self.decode_position = target
+
+    def _grab_to(self, target):
+        while self.decode_position < target:
+            if not self.video_capture.grab():
+                self.decode_position = None
+                return False
+
+            self.decode_position += 1
+
+        return True
+
+    def _seek_keyframe(self, target):
+        """Seek to the keyframe before the target and decode up to the target.
+
+        The frame the capture lands on is identified by its timestamp, so the
+        seek is exact even when the capture's own frame numbering is not.
+        """
+        keyframe = self.index.keyframe_before(target)
+        for _ in range(self.max_seek_attempts):
+            self.video_capture.set(cv2.CAP_PROP_POS_MSEC, self.index.timestamps[keyframe] * 1000)
+            if not self.video_capture.grab():
+                break
+
+            position = self.index.frame_at_timestamp(self.video_capture.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+            if position <= target:
+                self.decode_position = position + 1
+                if position == target or self._grab_to(target + 1):
+                    # The target frame is grabbed and waits to be retrieved
+                    self.decode_position = target
+                    self.grabbed = True
+
+                # Otherwise the target is past the end of the video and the
+                # capture is left at the end
+                return True
+
+            if keyframe == 0:
+                break
+            keyframe = self.index.keyframe_before(keyframe - 1)
+
+        self.decode_position = None
+        return False
+
+
+class DecoderPool:
+    """Independent decoders on the same video, for concurrent random access.
+
+    Each read goes to the idle decoder that reaches the requested frame with
+    the least decoding, so playback, scrubbing and background work each keep
+    their own position in the video instead of seeking one shared capture
+    back and forth. Decoders are opened on demand, when every idle decoder
+    would have to seek. Reads are thread-safe.
+    """
+    def __init__(self, video_path, index=None, size=1):
+        self.video_path = video_path
+        self.index = index
+        self.size = max(1, size)
+
+        self.decoders = [Decoder(video_path, index)]
+        self.idle = list(self.decoders)
+        self.condition = threading.Condition()
+        self.reads = 0
+        self.seeks = 0
+
+    def read(self, target):
+        decoder = self._acquire(target)
+        try:
+            return decoder.read(target)
+        finally:
+            with self.condition:
+                self.idle.append(decoder)
+                self.condition.notify()
+
+    def release(self):
+        with self.condition:
+            for decoder in self.decoders:
+                decoder.release()
+
+            self.decoders.clear()
+            self.idle.clear()
+
+    def pool_info(self):
+        with self.condition:
+            return {
+                'reads': self.reads,
+                'seeks': self.seeks,
+                'size': len(self.decoders),
+                'idle': len(self.idle),
+                'max_size': self.size,
+            }
+
+    def _acquire(self, target):
+        with self.condition:
+            while not self.idle and len(self.decoders) >= self.size:
+                self.condition.wait()
+
+            self.reads += 1
+            decoder = min(self.idle, key=lambda decoder: decoder.cost(target), default=None)
+            if (decoder is None or not decoder.can_grab(target)) and len(self.decoders) < self.size:
+                # Keep the positions of the other decoders
+                decoder = Decoder(self.video_path, self.index)
+                self.decoders.append(decoder)
+            else:
+                self.idle.remove(decoder)
+
+            if not decoder.can_grab(target):
+                self.seeks += 1
+
+            return decoder
@@ -0,0 +1,380 @@
+import os
+import copy
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from models import transforms
+from models.pipeline_spec import build_pipeline
+from models.studio_model import VideoController
+from models.video_index import VideoIndex
+from utils.disk_cache import DiskCache
+
+
+class VideoExporter:
+    """Render a video through a transform pipeline into a video file.
+
+    The export runs as a pipeline: a decode thread reads frames from the
+    original video into a bounded queue, a pool of workers composites them,
+    each with its own copy of the transforms, and the calling thread encodes
+    the composited frames in order. A stage that falls behind blocks the
+    stages before it, so at most a fixed number of frames is held in memory
+    whatever the length of the video. Nothing here needs Qt, exports can run
+    on machines without a display.
+    """
+    # Seconds between checks for cancellation while a stage is blocked
+    poll_interval = 0.1
+
+    # Default number of workers. Each one holds a copy of the transforms
+    # with full resolution buffers, and compositing holds the GIL for part
+    # of every frame, so more workers mostly add memory.
+    max_default_workers = 4
+
+    def __init__(self, video_path, transform, fourcc='mp4v', workers=None, queue_size=None):
+        self.video_path = video_path
+        self.transform = transform
+        self.fourcc = fourcc
+        self.workers = max(1, workers or min(self.max_default_workers, os.cpu_count() or 1))
+
+        # Frames waiting to be composited, and composited frames waiting to
+        # be encoded, beyond the ones the workers are busy with
+        self.queue_size = max(1, queue_size or 2 * self.workers)
+
+        self.cancelled = threading.Event()
+        self.stopped = threading.Event()
+        self.error = None
+
+        self.decoded = None
+        self.composited = {}
+        self.next_index = 0
+        self.decode_end = None
+        self.condition = threading.Condition()
+        self.lock = threading.Lock()
+        self._reset_stats()
+
+    def export(self, output_path, on_progress=None, start=0, end=None):
+        """Export the video, on_progress(frames_done, num_frames) is called after each frame.
+
+        Only frames start to end (exclusive, 0-based) are exported when given.
+        Returns the number of frames written.
+        """
+        video_controller = VideoController(self.video_path)
+        end = video_controller.num_frames if end is None else min(end, video_controller.num_frames)
+        num_frames = max(0, end - start)
+
+        self.stopped.clear()
+        self.error = None
+        self.decoded = queue.Queue(maxsize=self.queue_size)
+        self.composited = {}
+        self.next_index = start
+        self.decode_end = None
+        self._reset_stats()
+
+        threads = [threading.Thread(target=self._decode, args=(video_controller, start, end), daemon=True)]
+        for _ in range(self.workers):
+            # Transforms keep buffers and caches between frames
+            transform = copy.deepcopy(self.transform)
+            threads.append(threading.Thread(target=self._composite, args=(transform,), daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        writer = None
+        frame_index = start
+        try:
+            while True:
+                frame = self._next_composited(frame_index)
+                if frame is None:
+                    break
+
+                started = time.perf_counter()
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(
+                        output_path, cv2.VideoWriter_fourcc(*self.fourcc), video_controller.fps, (width, height))
+                    if not writer.isOpened():
+                        raise Exception(f'Could not create video file: {output_path}')
+
+                writer.write(frame)
+                frame_index += 1
+                self._count('encode', started)
+
+                if on_progress is not None:
+                    on_progress(frame_index - start, num_frames)
+        except BaseException as e:
+            self._fail(e)
+            raise
+        finally:
+            self.stopped.set()
+            with self.condition:
+                self.condition.notify_all()
+
+            for thread in threads:
+                thread.join()
+
+            if writer is not None:
+                writer.release()
+            video_controller.decoders.release()
+
+        if self.error is not None:
+            raise self.error
+
+        return frame_index - start
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def pipeline_info(self):
+        """Occupancy of each stage, the busiest stage is the bottleneck.
+
+        busy is the fraction of the time the threads of a stage spent working
+        rather than waiting on the stages around them, and queued the number
+        of frames waiting for the composite and encode stages.
+        """
+        with self.lock:
+            elapsed = max(1e-9, (self.finished or time.perf_counter()) - self.started)
+            threads = {'decode': 1, 'composite': self.workers, 'encode': 1}
+            info = {
+                stage: {
+                    'frames': stats['frames'],
+                    'busy': min(1.0, stats['seconds'] / elapsed / threads[stage]),
+                    'threads': threads[stage],
+                }
+                for stage, stats in self.stats.items()
+            }
+
+        info['composite']['queued'] = self.decoded.qsize() if self.decoded is not None else 0
+        with self.condition:
+            info['encode']['queued'] = len(self.composited)
+        return info
+
+    def _reset_stats(self):
+        with self.lock:
+            self.stats = {stage: {'frames': 0, 'seconds': 0.0} for stage in ('decode', 'composite', 'encode')}
+            self.started = time.perf_counter()
+            self.finished = None
+
+    def _count(self, stage, started):
+        with self.lock:
+            self.stats[stage]['frames'] += 1
+            self.stats[stage]['seconds'] += time.perf_counter() - started
+
+    def _running(self):
+        return not self.stopped.is_set() and not self.cancelled.is_set()
+
+    def _fail(self, error):
+        with self.condition:
+            if self.error is None and not isinstance(error, KeyboardInterrupt):
+                self.error = error
+            self.stopped.set()
+            self.condition.notify_all()
+
+    def _decode(self, video_controller, start, end):
+        frame_index = start
+        try:
+            while frame_index < end and self._running():
+                started = time.perf_counter()
+                frame = video_controller.read_decoded(frame_index)
+                if frame is None:
+                    break
+                self._count('decode', started)
+
+                # Blocks while the workers are behind
+                while self._running():
+                    try:
+                        self.decoded.put((frame_index, frame), timeout=self.poll_interval)
+                        break
+                    except queue.Full:
+                        continue
+
+                frame_index += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            with self.condition:
+                self.decode_end = frame_index
+                self.condition.notify_all()
+
+    def _composite(self, transform):
+        try:
+            while self._running():
+                try:
+                    frame_index, frame = self.decoded.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    with self.condition:
+                        if self.decode_end is not None:
+                            return
+                    continue
+
+                started = time.perf_counter()
+
+                # Frames are indexed by the read position after decoding them
+                ctx = transform(transforms.FrameContext(input=frame, frame_index=frame_index + 1))
+
+                # The composited frame lives in a buffer reused by the next frame
+                output = ctx.input.copy()
+                self._count('composite', started)
+
+                with self.condition:
+                    # Blocks while the encoder is behind, frames are encoded in
+                    # order so frames after a slow one wait here
+                    while frame_index >= self.next_index + self.queue_size and self._running():
+                        self.condition.wait(self.poll_interval)
+
+                    self.composited[frame_index] = output
+                    self.condition.notify_all()
+        except Exception as e:
+            self._fail(e)
+
+    def _next_composited(self, frame_index):
+        with self.condition:
+            self.next_index = frame_index
+            self.condition.notify_all()
+
+            while frame_index not in self.composited:
+                if not self._running():
+                    return
+                if self.decode_end is not None and frame_index >= self.decode_end:
+                    with self.lock:
+                        self.finished = time.perf_counter()
+                    return
+
+                self.condition.wait(self.poll_interval)
+
+            return self.composited.pop(frame_index)
+
+
+def _export_segment(video_path, spec, fourcc, segment_path, start, end):
+    # Each process composites on its own core already
+    cv2.setNumThreads(1)
+
+    # Frame times come from the index sidecar, not through the spec
+    index = VideoIndex.load_or_build(video_path)
+    frame_times = index.frame_times() if index is not None else None
+
+    exporter = VideoExporter(video_path, build_pipeline(spec, frame_times=frame_times), fourcc=fourcc, workers=1)
+    return exporter.export(segment_path, start=start, end=end)
+
+
+class SegmentedExporter:
+    """Export a video in segments rendered by separate processes.
+
+    Compositing is Python code that holds the GIL, so the workers of a single
+    VideoExporter share one core for it. Here the timeline is split at
+    keyframes into segments, each exported by a VideoExporter in its own
+    process with its own decoders and a pipeline rebuilt from the spec (see
+    models.pipeline_spec), and ffmpeg joins the encoded segments without
+    re-encoding them. Cancelling skips the segments that have not started
+    yet.
+    """
+    segment_dir = DiskCache.root / 'segments'
+
+    # More segments than processes, so processes that finish early pick up
+    # the remaining work instead of idling
+    segments_per_process = 2
+
+    # Shorter segments are not worth starting a process for
+    min_segment_frames = 60
+
+    def __init__(self, video_path, spec, fourcc='mp4v', processes=None):
+        self.video_path = video_path
+        self.spec = spec
+        self.fourcc = fourcc
+        self.processes = max(1, processes or os.cpu_count() or 1)
+
+        self.cancelled = threading.Event()
+        self.futures = []
+
+    def export(self, output_path, on_progress=None):
+        """Export the video, on_progress(frames_done, num_frames) is called after each segment.
+
+        Returns the number of frames written.
+        """
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise Exception('ffmpeg was not found, it is needed to join the exported segments')
+
+        video_controller = VideoController(self.video_path)
+        num_frames = video_controller.num_frames
+        segments = self.segments(video_controller)
+        video_controller.decoders.release()
+
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = tempfile.mkdtemp(dir=self.segment_dir)
+        extension = Path(output_path).suffix or '.mp4'
+        segment_paths = [os.path.join(work_dir, f'{i:05d}{extension}') for i in range(len(segments))]
+
+        frames_done = 0
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(segments))) as executor:
+                self.futures = [
+                    executor.submit(_export_segment, self.video_path, self.spec, self.fourcc, path, start, end)
+                    for path, (start, end) in zip(segment_paths, segments)
+                ]
+                if self.cancelled.is_set():
+                    self.cancel()
+
+                try:
+                    for future in as_completed(self.futures):
+                        if future.cancelled():
+                            continue
+
+                        frames_done += future.result()
+                        if on_progress is not None:
+                            on_progress(frames_done, num_frames)
+                except BaseException:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+            if self.cancelled.is_set():
+                return frames_done
+
+            self._join(ffmpeg, [path for path in segment_paths if os.path.exists(path)], output_path, work_dir)
+        finally:
+            self.futures = []
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return frames_done
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+    def segments(self, video_controller):
+        """Split the video into (start, end) frame ranges that start at keyframes."""
+        num_frames = video_controller.num_frames
+        count = max(1, min(self.processes * self.segments_per_process, num_frames // self.min_segment_frames))
+
+        starts = {0}
+        for i in range(1, count):
+            start = i * num_frames // count
+            if video_controller.index is not None:
+                # A process decodes nothing before the frames it exports
+                start = int(video_controller.index.keyframe_before(start))
+            starts.add(start)
+
+        bounds = sorted(starts) + [num_frames]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _join(self, ffmpeg, segment_paths, output_path, work_dir):
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w') as file:
+            for path in segment_paths:
+                file.write(f"file '{path}'\n")
+
+        result = subprocess.run(
+            [ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+             '-c', 'copy', output_path],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f'Could not join the exported segments: {result.stderr.strip()}')
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """LRU cache of rendered frames, bounded by their total size in bytes.
+
+    Frames are keyed by (frame_index, fingerprint), where the fingerprint
+    identifies the settings the frame was rendered with. Entries rendered with
+    other settings are kept, so switching a setting back is a cache hit.
+    Cached frames are shared and must not be modified.
+
+    Frames are rendered on the video thread while the GUI thread
+    invalidates them. Every invalidation starts a new generation, and a
+    frame rendered during an older generation is not stored.
+    """
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, frame_index, fingerprint):
+        key = (frame_index, fingerprint)
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return
+
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, frame_index, fingerprint, frame, generation=None):
+        """Store a frame, unless the cache was invalidated since the given generation."""
+        key = (frame_index, fingerprint)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            if key in self.frames:
+                self.nbytes -= self.frames.pop(key).nbytes
+
+            if frame.nbytes > self.max_bytes:
+                return
+
+            self.frames[key] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def invalidate(self, frame_indices=None):
+        """Drop the given frames for every fingerprint, or all frames."""
+        with self.lock:
+            # Frames being rendered may predate the change
+            self.generation += 1
+
+            if frame_indices is None:
+                self.frames.clear()
+                self.nbytes = 0
+                return
+
+            frame_indices = set(frame_indices)
+            for key in [key for key in self.frames if key[0] in frame_indices]:
+                self.nbytes -= self.frames.pop(key).nbytes
+
+    def cache_info(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.frames),
+                'nbytes': self.nbytes,
+                'max_nbytes': self.max_bytes,
+            }
@@ -0,0 +1,85 @@
+import os
+
+import cv2
+import numpy as np
+
+from models.cached_media import CachedMedia
+from utils.disk_cache import DiskCache
+
+
+class FrameStore(CachedMedia):
+    """Decoded frames of a video kept in a memory-mapped file on disk.
+
+    The video is decoded once on a background thread into an uncompressed
+    array of frames, after which reading a frame is a view into the mapping
+    and the OS page cache decides which frames stay in memory. The store is
+    reused while the video is unchanged, within the budget of the DiskCache.
+    Frames are read-only.
+    """
+    kind = 'frames'
+
+    def __init__(self, video_path, width, height):
+        super().__init__(video_path, f'{width}x{height}', '.npy')
+        self.width = width
+        self.height = height
+        self.frames = None
+
+    @property
+    def ready(self):
+        return self.frames is not None
+
+    def open(self):
+        self.frames = np.load(self.path, mmap_mode='r')
+        DiskCache.touch(self.path)
+
+    def read(self, frame_index):
+        if not 0 <= frame_index < len(self.frames):
+            return
+
+        return self.frames[frame_index]
+
+    def build(self, num_frames):
+        """Decode the video into the store and open it, returns whether it completed."""
+        partial_path = self.partial_path()
+        frames = np.lib.format.open_memmap(
+            partial_path, mode='w+', dtype=np.uint8, shape=(num_frames, self.height, self.width, 3))
+
+        video_capture = cv2.VideoCapture(self.video_path)
+        frame_index = 0
+        try:
+            while frame_index < num_frames and not self.cancelled.is_set():
+                ret, frame = video_capture.read()
+                if not ret:
+                    break
+
+                if frame.shape[1] != self.width or frame.shape[0] != self.height:
+                    cv2.resize(frame, (self.width, self.height), dst=frames[frame_index], interpolation=cv2.INTER_AREA)
+                else:
+                    frames[frame_index] = frame
+
+                frame_index += 1
+                self.progress = frame_index / num_frames
+        finally:
+            video_capture.release()
+
+        if self.cancelled.is_set():
+            del frames
+            os.remove(partial_path)
+            return False
+
+        if frame_index < num_frames:
+            # The video has fewer frames than its index, keep the decoded ones
+            truncated_path = self.partial_path('partial-truncated')
+            truncated = np.lib.format.open_memmap(
+                truncated_path, mode='w+', dtype=np.uint8, shape=(frame_index,) + frames.shape[1:])
+            truncated[:] = frames[:frame_index]
+            truncated.flush()
+            del frames, truncated
+            os.replace(truncated_path, partial_path)
+        else:
+            frames.flush()
+            del frames
+
+        self.publish(partial_path)
+        self.open()
+        return True
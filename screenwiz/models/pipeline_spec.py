@@ -0,0 +1,48 @@
+from models import transforms
+
+
+# Version of the spec layout, bumped on incompatible changes
+VERSION = 1
+
+
+def build_pipeline(spec, frame_times=None):
+    """Build the transform pipeline described by a spec.
+
+    A spec holds the editing settings as plain JSON-compatible values, so it
+    can be saved or sent to other processes and machines instead of the
+    transforms with their images and caches:
+
+        version       VERSION
+        aspect_ratio  'Auto' or 'W:H'
+        padding       padding in pixels of the source video
+        radius        corner radius in pixels
+        zoom          {'fps': frame rate, 'tracks': click dicts of the zoom tracks}
+        background    {'type': 'wallpaper' or 'color', 'value': number or '#RRGGBB'}
+        cursor        {'size': cursor size in pixels, 'moves': (x, y, type) per frame},
+                      the cursor is not drawn without moves
+
+    frame_times, one per frame of the video (see VideoIndex.frame_times()),
+    are kept out of the spec so it stays small. Without them zooms are timed
+    by fps.
+    """
+    version = spec.get('version')
+    if version != VERSION:
+        raise Exception(f'Unsupported pipeline spec version: {version}')
+
+    pipeline = {
+        'aspect_ratio': transforms.AspectRatio(spec['aspect_ratio']),
+        'padding': transforms.Padding(padding=spec['padding']),
+    }
+
+    cursor = spec.get('cursor')
+    if cursor and cursor['moves']:
+        pipeline['cursor'] = transforms.Cursor(move_data=cursor['moves'], size=cursor['size'])
+
+    pipeline.update({
+        'zoom': transforms.Zoom(click_data=[dict(track) for track in spec['zoom']['tracks']], fps=spec['zoom']['fps'],
+                                 frame_times=frame_times),
+        'roundness': transforms.Roundness(radius=spec['radius']),
+        'shadow': transforms.Shadow(),
+        'background': transforms.Background(background=dict(spec['background'])),
+    })
+    return transforms.Compose(pipeline)
@@ -0,0 +1,63 @@
+import os
+
+import cv2
+
+from models.cached_media import CachedMedia
+
+
+def scaled_size(width, height, target_height):
+    """Scale a frame size to the given height, keeping the width even for encoders."""
+    return max(2, round(width * target_height / height / 2) * 2), target_height
+
+
+class ProxyMedia(CachedMedia):
+    """Reduced-resolution copy of a video where every frame is a keyframe.
+
+    Previews decode the proxy instead of the original, so a seek decodes a
+    single small frame. The proxy is built on a background thread the first
+    time a video is opened and is reused while the video is unchanged, within
+    the budget of the DiskCache.
+    """
+    kind = 'proxy'
+
+    def __init__(self, video_path, height=540):
+        super().__init__(video_path, f'{height}p', '.avi')
+        self.height = height
+
+    def build(self, num_frames=None):
+        """Transcode the video into the proxy, returns whether it completed."""
+        video_capture = cv2.VideoCapture(self.video_path)
+        fps = video_capture.get(cv2.CAP_PROP_FPS)
+        frame_width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        num_frames = num_frames or int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        width, _ = scaled_size(frame_width, frame_height, self.height)
+        partial_path = self.partial_path()
+
+        # Motion JPEG compresses every frame on its own
+        writer = cv2.VideoWriter(partial_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, self.height))
+        if not writer.isOpened():
+            video_capture.release()
+            raise Exception(f'Could not create proxy file: {partial_path}')
+
+        frame_index = 0
+        try:
+            while not self.cancelled.is_set():
+                ret, frame = video_capture.read()
+                if not ret:
+                    break
+
+                writer.write(cv2.resize(frame, (width, self.height), interpolation=cv2.INTER_AREA))
+                frame_index += 1
+                self.progress = min(1.0, frame_index / max(1, num_frames))
+        finally:
+            writer.release()
+            video_capture.release()
+
+        if self.cancelled.is_set():
+            os.remove(partial_path)
+            return False
+
+        self.publish(partial_path)
+        return True
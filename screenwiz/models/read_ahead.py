@@ -0,0 +1,133 @@
+import threading
+from collections import deque
+
+
+class ReadAheadDecoder:
+    """Decode frames ahead of the playhead on a background thread.
+
+    Wraps a VideoController with the same read() interface. While started,
+    the decoder thread owns the controller and keeps a bounded ring of
+    decoded frames ahead of the read position. Reading a frame outside the
+    ring flushes it and restarts decoding at that frame.
+    """
+    def __init__(self, video_controller, max_frames=8):
+        self.video_controller = video_controller
+        self.max_frames = max_frames
+
+        # Decoded (position, frame) pairs, positions follow VideoController.frame_index
+        self.frames = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        self._position = video_controller.frame_index
+        self._decode_position = self._position + 1
+        self._seek_position = None
+        self._generation = 0
+        self._ended = False
+
+    def start(self):
+        with self.condition:
+            self.frames.clear()
+            self.running = True
+            self._ended = False
+            self._seek_position = self._position + 1
+            self._decode_position = self._seek_position
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.frames.clear()
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        # Hand the read position back to the controller
+        self.video_controller.set_position(self._position)
+
+    def read(self, frame_index=None):
+        if isinstance(frame_index, int):
+            position = max(0, frame_index - 1) + 1
+        else:
+            position = self._position + 1
+
+        with self.condition:
+            if not self.running:
+                raise Exception('Read-ahead decoder is not running.')
+
+            # Frames further ahead than the ring are faster to reach by seeking
+            if not self._decode_position <= position <= self._decode_position + self.max_frames:
+                if not (self.frames and self.frames[0][0] <= position <= self.frames[-1][0]):
+                    self._request_seek(position)
+
+            while True:
+                while self.frames and self.frames[0][0] < position:
+                    self.frames.popleft()
+                    self.condition.notify_all()
+
+                if self.frames:
+                    if self.frames[0][0] == position:
+                        _, frame = self.frames.popleft()
+                        self.condition.notify_all()
+                        self._position = position
+                        return frame
+
+                    # The ring skipped the position, which only happens at a seek
+                    self._request_seek(position)
+                elif self._ended and self._seek_position is None:
+                    # Like the controller, stop at the end of the video
+                    self._position = min(position - 1, self.video_controller.num_frames)
+                    return
+
+                self.condition.wait()
+
+    def set_position(self, position):
+        """Move the read position without seeking until a frame is decoded."""
+        self._position = position
+
+    @property
+    def frame_index(self):
+        return self._position
+
+    def _request_seek(self, position):
+        self.frames.clear()
+        self._ended = False
+        self._seek_position = position
+        self._decode_position = position
+        self._generation += 1
+        self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self._seek_position is None and (
+                        self._ended or len(self.frames) >= self.max_frames):
+                    self.condition.wait()
+
+                if not self.running:
+                    return
+
+                frame_index, self._seek_position = self._seek_position, None
+                generation = self._generation
+
+            # Decode without holding the lock, OpenCV releases the GIL meanwhile
+            frame = self.video_controller.read(frame_index)
+
+            with self.condition:
+                if generation != self._generation:
+                    # Flushed by a seek while decoding
+                    continue
+
+                if frame is None:
+                    self._ended = True
+                else:
+                    position = self.video_controller.frame_index
+                    self.frames.append((position, frame))
+                    self._decode_position = position + 1
+
+                self.condition.notify_all()
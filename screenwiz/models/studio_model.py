@@ -1,91 +1,194 @@
+import threading
 from collections import OrderedDict
 
 import cv2
 
 from models import transforms
+from models.backward_cache import BackwardCache
+from models.decoder_pool import DecoderPool
+from models.frame_cache import FrameCache
+from models.frame_store import FrameStore
+from models.pipeline_spec import build_pipeline, VERSION as PIPELINE_SPEC_VERSION
+from models.proxy import ProxyMedia, scaled_size
+from models.read_ahead import ReadAheadDecoder
+from models.video_index import VideoIndex
+from utils.disk_cache import DiskCache
 from utils.general import find_largest_leq_sorted
 from config import config
 
 
 class StudioModel:
-    def __init__(self, video_path: str = None):
-        self.video_path = video_path
-        self.video_path = '/home/tamnv/Downloads/upwork-contract-exporter.mp4'
+    def __init__(self, video_path: str = None, preview: bool = True):
+        self.video_path = video_path or '/home/tamnv/Downloads/upwork-contract-exporter.mp4'
+
+        # Without preview, e.g. for headless exports, frames are decoded
+        # from the original without the caches and proxies used for editing
+        self.preview = preview
 
         self.load()
 
     def load(self):
-        self.video_controller = VideoController(video_path=self.video_path)
+        # Proxies and frame stores of earlier videos are evicted to fit
+        DiskCache.set_max_bytes(config['cache']['disk_mb'] * 1024 * 1024)
+
+        if self.preview:
+            self.video_controller = VideoController(
+                video_path=self.video_path,
+                backward_cache_bytes=config['cache']['backward_frames_mb'] * 1024 * 1024,
+                decoder_pool_size=config['video']['decoder_pool_size'],
+                proxy_height=config['video']['proxy_height'],
+                proxy_min_height=config['video']['proxy_min_height'],
+                proxy_min_seconds=config['video']['proxy_min_seconds'],
+                frame_store=config['video']['frame_store'],
+                frame_store_max_bytes=config['video']['frame_store_max_mb'] * 1024 * 1024)
+        else:
+            self.video_controller = VideoController(video_path=self.video_path)
+
+        # Frames are read from the controller, or from the read-ahead
+        # decoder wrapping it during playback
+        self.frame_reader = self.video_controller
 
         # Settings
         self.aspect_ratio = 'Auto'
         self.padding = 100
         self.inset = 10
         self.border_radius = 50
+        self.cursor_size = 64
 
-        # Transforms
+        # Transforms are updated in place from the GUI thread while frames
+        # are rendered on the video thread, so both hold this lock
+        self.transform_lock = threading.Lock()
+
+        # Transforms, exports only get the zoom tracks they are given
         self.mouse_events = {
             'click': [
                 {'x': 0.5, 'y': 0.5, 'frame_index': 50, 'duration': 1.5},
                 {'x': 0.5, 'y': 0.5, 'frame_index': 150, 'duration': 1.5},
-            ],
+            ] if self.preview else [],
             'move': []
         }
-        background = {'type': 'wallpaper','value': 1}
-        self.transform = transforms.Compose({
-            'aspect_ratio': transforms.AspectRatio('Auto'),
-            'padding': transforms.Padding(padding=self.padding),
-            # 'inset': Inset(inset=0),
-            'zoom': transforms.Zoom(click_data=self.mouse_events['click'], fps=self.video_controller.fps),
-            'roundness': transforms.Roundness(radius=self.border_radius),
-            'shadow': transforms.Shadow(),
-            'background': transforms.Background(background=background),
-        })
+        self.background = {'type': 'wallpaper','value': 1}
+        self.transform = build_pipeline(self.pipeline_spec(), frame_times=self.video_controller.frame_times())
+        self._compile_layout()
         self.video_len = self.video_controller.video_len
         self.fps = self.video_controller.fps
         self.pixels_per_second = config['layout']['video_edit']['pixels_per_second']
 
-    def read(self, frame_index=None):
-        frame = self.video_controller.read(frame_index)
+        # Rendered frames, so scrubbing over a region again is a lookup
+        self.frame_cache = FrameCache(max_bytes=config['cache']['rendered_frames_mb'] * 1024 * 1024)
+        self._update_fingerprint()
+
+        # Size of the frame preview in device pixels, see read()
+        self.preview_size = None
+
+    def read(self, frame_index=None, target_size=None):
+        """Read and render a frame.
+
+        The frame is rendered scaled down to fit target_size (width, height),
+        which defaults to the preview size, or at full size without either.
+        """
+        # Frames are indexed by the read position after decoding them
+        if isinstance(frame_index, int):
+            position = max(0, frame_index - 1) + 1
+        else:
+            position = self.frame_reader.frame_index + 1
+
+        scale = self._render_scale(target_size or self.preview_size)
+
+        if self.transform:
+            frame = self.frame_cache.get(position, self.fingerprint + (scale,))
+            if frame is not None:
+                self.frame_reader.set_position(position)
+                return frame
+
+        frame = self.frame_reader.read(frame_index)
 
         if frame is None:
             return
 
+        # Every transform runs at the output scale. Proxy and frame store
+        # frames come at their own resolution and are resized straight to it
+        height, width = frame.shape[:2]
+        size = (max(1, round(self.video_controller.frame_width * scale)),
+                max(1, round(self.video_controller.frame_height * scale)))
+        if (width, height) != size:
+            interpolation = cv2.INTER_AREA if width > size[0] else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, size, interpolation=interpolation)
+
         if self.transform:
-            frame_index = self.video_controller.frame_index
-            result = self.transform(input=frame, frame_index=frame_index)
-            frame = result['input']
+            frame_index = self.frame_reader.frame_index
+            with self.transform_lock:
+                # Settings only change under the lock, so the frame is
+                # stored under the settings it is rendered with
+                fingerprint = self.fingerprint + (scale,)
+                generation = self.frame_cache.generation
+                ctx = self.transform(transforms.FrameContext(input=frame, frame_index=frame_index, scale=scale))
+
+                # The composited frame lives in a buffer reused by the next
+                # frame, copy it before it is handed over to the GUI thread
+                frame = ctx.input.copy()
+            self.frame_cache.put(frame_index, fingerprint, frame, generation)
 
         return frame
 
+    def set_preview_size(self, width, height):
+        self.preview_size = (width, height) if width > 0 and height > 0 else None
+
     def current_frame(self):
-        prev_frame_index = max(0, self.video_controller.frame_index - 1)
+        prev_frame_index = max(0, self.frame_reader.frame_index - 1)
         return self.read(prev_frame_index)
 
     def current_frame_index(self):
-        return self.video_controller.frame_index
+        return self.frame_reader.frame_index
 
     def next_frame(self):
         return self.read()
 
     def prev_frame(self):
-        prev_frame_index = max(0, self.video_controller.frame_index - 1)
+        prev_frame_index = max(0, self.frame_reader.frame_index - 1)
         return self.read(prev_frame_index)
 
+    def start_read_ahead(self):
+        """Decode frames ahead of the playhead on a background thread."""
+        if self.frame_reader is not self.video_controller:
+            return
+
+        self.frame_reader = ReadAheadDecoder(self.video_controller, max_frames=config['cache']['read_ahead_frames'])
+        self.frame_reader.start()
+
+    def stop_read_ahead(self):
+        if self.frame_reader is self.video_controller:
+            return
+
+        self.frame_reader.stop()
+        self.frame_reader = self.video_controller
+
+    def frame_at(self, seconds):
+        return self.video_controller.frame_at(seconds)
+
+    def time_of(self, frame_index):
+        return self.video_controller.time_of(frame_index)
+
     def update_aspect_ratio(self, value):
         self.aspect_ratio = value
-        self.transform['aspect_ratio'] = transforms.AspectRatio(aspect_ratio=value)
+        with self.transform_lock:
+            self.transform.update('aspect_ratio', aspect_ratio=value)
+            self._update_fingerprint()
 
     def update_padding(self, value):
         self.padding = value
-        self.transform['padding'] = transforms.Padding(padding=value)
+        with self.transform_lock:
+            self.transform.update('padding', padding=value)
+            self._update_fingerprint()
 
     def update_inset(self, value):
         self.inset = value
 
     def update_border_radius(self, value):
         self.border_radius = value
-        self.transform['roundness'] = transforms.Roundness(radius=value)
+        with self.transform_lock:
+            self.transform.update('roundness', radius=value)
+            self._update_fingerprint()
 
     def update_zoom_tracks(self, data):
         # Remove all delete-marked tracks
@@ -99,10 +202,7 @@ class StudioModel:
         for key, value in data.items():
             click[key] = value
 
-        self.transform['zoom'] = transforms.Zoom(
-            click_data=self.mouse_events['click'],
-            fps=self.video_controller.fps
-        )
+        self._update_zoom()
 
         return self.mouse_events['click']
 
@@ -111,7 +211,7 @@ class StudioModel:
         self._clean_delete_click_data()
 
         x_pos = data['x_pos']
-        frame_index = x_pos / self.pixels_per_second * self.video_controller.fps
+        frame_index = self.frame_at(x_pos / self.pixels_per_second)
 
         # Find position for the new track
         frame_indices = [item['frame_index'] for item in self.mouse_events['click']]
@@ -121,10 +221,7 @@ class StudioModel:
 
         self.mouse_events['click'].insert(insert_index, data)
 
-        self.transform['zoom'] = transforms.Zoom(
-            click_data=self.mouse_events['click'],
-            fps=self.video_controller.fps
-        )
+        self._update_zoom()
 
         return self.mouse_events['click']
 
@@ -151,30 +248,198 @@ class StudioModel:
 
         self.mouse_events['click'] = new_click_data
 
+    def _update_zoom(self):
+        zoom = self.transform['zoom']
+        with self.transform_lock:
+            zoom_factors, positions = zoom.zoom_factors, zoom.positions
+            self.transform.update('zoom', click_data=self.mouse_events['click'])
+
+        # Only the frames whose zoom changed have to be rendered again
+        self.frame_cache.invalidate(zoom.changed_frames(zoom_factors, positions))
+
     def update_wallpaper(self, data):
-        self.transform['background'] = transforms.Background(background=data)
+        self.background = data
+        with self.transform_lock:
+            self.transform.update('background', background=data)
+            self._update_fingerprint()
+
+    def pipeline_spec(self):
+        """Describe the transform pipeline with plain values, see build_pipeline()."""
+        return {
+            'version': PIPELINE_SPEC_VERSION,
+            'aspect_ratio': self.aspect_ratio,
+            'padding': self.padding,
+            'radius': self.border_radius,
+            'zoom': {
+                'fps': float(self.video_controller.fps),
+                'tracks': [dict(click) for click in self.mouse_events['click'] if not click.get('delete')],
+            },
+            'background': dict(self.background),
+            'cursor': {'size': self.cursor_size, 'moves': list(self.mouse_events['move'])},
+        }
+
+    def _update_fingerprint(self):
+        # Identifies the settings that affect every rendered frame
+        self.fingerprint = (
+            self.aspect_ratio,
+            self.padding,
+            self.border_radius,
+            tuple(sorted(self.background.items())),
+        )
+
+    def _render_scale(self, target_size):
+        if target_size is None or not self.transform:
+            return 1.0
+
+        # The output size only depends on the aspect ratio setting
+        layout = self.transform['aspect_ratio'].plan(transforms.FrameContext(
+            frame_width=self.video_controller.frame_width,
+            frame_height=self.video_controller.frame_height))
+
+        width, height = target_size
+        return min(1.0, width / layout.video_width, height / layout.video_height)
+
+    def _compile_layout(self):
+        # Precompute the static frame geometry before the first frame,
+        # Compose.update() keeps it current afterwards
+        self.transform.compile(self.video_controller.frame_width, self.video_controller.frame_height)
 
 
 class VideoController:
-    def __init__(self, video_path: str):
+    def __init__(self, video_path: str, backward_cache_bytes=0, decoder_pool_size=1, proxy_height=0,
+                 proxy_min_height=0, proxy_min_seconds=0, frame_store='off', frame_store_max_bytes=0):
         self.video_path = video_path
-        self.video_capture = cv2.VideoCapture(video_path)
-        self.fps = int(self.video_capture.get(cv2.CAP_PROP_FPS))
-        self.frame_width = int(self.video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.frame_height = int(self.video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.num_frames = int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.video_len = self.num_frames / self.fps
+
+        # Exact frame timestamps and keyframes, loaded from a sidecar file
+        # when the video was opened before
+        self.index = VideoIndex.load_or_build(video_path)
+
+        # Decoders for concurrent readers, read_decoded() picks the closest one
+        self.decoders = DecoderPool(video_path, self.index, size=decoder_pool_size)
+
+        video_capture = self.decoders.decoders[0].video_capture
+        self.frame_width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if self.index is not None:
+            self.fps = self.index.fps
+            self.num_frames = self.index.num_frames
+            self.video_len = self.index.duration
+        else:
+            self.fps = video_capture.get(cv2.CAP_PROP_FPS)
+            self.num_frames = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.video_len = self.num_frames / self.fps
+
+        # Read position as reported by frame_index
+        self._position = 0
+
+        # Stepping backwards needs keyframe positions
+        self.backward_cache = None
+        if backward_cache_bytes and self.index is not None:
+            self.backward_cache = BackwardCache(self, max_bytes=backward_cache_bytes)
+
+        # Optionally, short videos are decoded once into a memory-mapped
+        # file of raw frames, at the proxy resolution for 'preview'
+        self.frame_store = None
+        if frame_store in ('preview', 'full'):
+            width, height = self.frame_width, self.frame_height
+            if frame_store == 'preview' and proxy_height and height > proxy_height:
+                width, height = scaled_size(width, height, proxy_height)
+
+            nbytes = self.num_frames * height * width * 3
+            if nbytes <= frame_store_max_bytes and nbytes <= DiskCache.max_bytes:
+                self.frame_store = FrameStore(video_path, width, height)
+                if self.frame_store.exists():
+                    self.frame_store.open()
+                else:
+                    self.frame_store.start(self.num_frames)
+
+        # Frames of long, high-resolution videos are decoded from a
+        # low-resolution proxy once it is built, shorter or smaller videos
+        # decode fast enough to not spend the disk space on it. Without
+        # proxy_height the original is read, as export needs
+        self.proxy = None
+        self.proxy_decoders = None
+        if (proxy_height and self.frame_height > proxy_height and self.frame_height >= proxy_min_height
+                and self.video_len >= proxy_min_seconds and self.frame_store is None):
+            self.proxy = ProxyMedia(video_path, height=proxy_height)
+            if self.proxy.exists():
+                self._open_proxy()
+            else:
+                self.proxy.start(self.num_frames, on_ready=self._open_proxy)
 
     def read(self, frame_index=None):
         if isinstance(frame_index, int):
-            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index - 1)
-
-        ret, frame = self.video_capture.read()
-        if not ret:
+            target = max(0, frame_index - 1)
+        else:
+            target = self._position
+
+        if self.backward_cache is not None and not (self.frame_store and self.frame_store.ready):
+            # Short steps back are served from decoded runs of frames
+            if self._position - 1 - self.backward_cache.run_length <= target < self._position - 1:
+                frame = self.backward_cache.step_back(target)
+            else:
+                frame = self.backward_cache.get(target)
+
+            if frame is not None:
+                self._position = target + 1
+                return frame
+
+        frame = self.read_decoded(target)
+        if frame is None:
+            # Like the capture, stop at the end of the video
+            self._position = min(target, self.num_frames)
             return
 
+        self._position = target + 1
         return frame
 
+    def read_decoded(self, target):
+        """Decode the frame with the given 0-based index, bypassing the caches.
+
+        Frames from the proxy or a 'preview' frame store are returned at their
+        own resolution, callers scale them to the size they render at.
+        Safe to call from several threads.
+        """
+        if self.frame_store is not None and self.frame_store.ready:
+            # A read-only view into the mapped file
+            return self.frame_store.read(target)
+
+        proxy_decoders = self.proxy_decoders
+        if proxy_decoders is None:
+            return self.decoders.read(target)
+
+        return proxy_decoders.read(target)
+
+    def _open_proxy(self):
+        DiskCache.touch(self.proxy.path)
+        index = VideoIndex.load_or_build(self.proxy.path)
+        self.proxy_decoders = DecoderPool(self.proxy.path, index, size=self.decoders.size)
+
+    def set_position(self, position):
+        """Move the read position without seeking until a frame is decoded."""
+        self._position = position
+
+    def frame_at(self, seconds):
+        """Return the frame index shown at the given time of the video."""
+        if self.index is not None:
+            return self.index.frame_at(seconds)
+
+        return int(seconds * self.fps)
+
+    def time_of(self, frame_index):
+        """Return the time of the given frame index."""
+        if self.index is not None:
+            return self.index.time_of(frame_index)
+
+        return frame_index / self.fps
+
+    def frame_times(self):
+        """Return the time of every frame, or None without an index."""
+        if self.index is None:
+            return
+
+        return self.index.frame_times()
+
     @property
     def frame_index(self):
-        return int(self.video_capture.get(cv2.CAP_PROP_POS_FRAMES))
\ No newline at end of file
+        return self._position
@@ -1,33 +1,229 @@
 import re
 import platform
+from pathlib import Path
+from collections import OrderedDict
 from enum import Enum, auto
 
 import cv2
 import numpy as np
-# from utils.image import ImageAssets
-from utils.general import hex_to_rgb, find_largest_leq_sorted
+from utils.image import ImageAssets
+from utils.general import hex_to_rgb
+
+
+IMAGES_DIR = Path(__file__).resolve().parent.parent / 'resources' / 'images'
+WALLPAPER_DIR = IMAGES_DIR / 'wallpaper' / 'full'
+CURSOR_DIR = IMAGES_DIR / 'cursor'
+
+class FrameContext:
+    """Per-frame state passed by reference through the transforms.
+
+    Compose fills in the geometry from its layout plan and every transform
+    reads and updates the fields it cares about. Layout plans are frame
+    contexts too, with only the geometry fields set.
+
+    Frames rendered below the source resolution carry the scale they are
+    rendered at, pixel-sized parameters (padding, radius, ...) are multiplied
+    by it so the result looks the same at any size.
+    """
+    __slots__ = (
+        'input', 'frame_index', 'scale',
+        'video_width', 'video_height', 'frame_width', 'frame_height',
+        'x_offset', 'y_offset', 'zoom_factor',
+        'mask', 'corner_masks', 'mask_rounded_corners', 'shadow_mask',
+    )
+
+    def __init__(
+        self,
+        input=None,
+        frame_index=0,
+        scale=1.0,
+        video_width=None,
+        video_height=None,
+        frame_width=None,
+        frame_height=None
+    ):
+        self.input = input
+        self.frame_index = frame_index
+        self.scale = scale
+        self.video_width = video_width
+        self.video_height = video_height
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.x_offset = 0
+        self.y_offset = 0
+        self.zoom_factor = 1
+        self.mask = None
+        self.corner_masks = None
+        self.mask_rounded_corners = None
+        self.shadow_mask = None
 
 
 class BaseTransform:
+    # Static transforms only depend on the input frame size, so they are
+    # folded into the layout plan instead of running on every frame.
+    static = False
+
+    # Parameters that can be changed in place with update(), mapped to the
+    # types they accept
+    params = {}
+
+    # Transforms that draw on ctx.input in place
+    mutates_input = False
+
     def __init__(self):
         pass
 
-    def __call__(self, **kwargs):
+    def plan(self, layout):
+        """Precompute the per-layout state and return the updated layout."""
+        return layout
+
+    def update(self, **params):
+        """Change parameters in place, keeping the caches they do not affect."""
+        for name, value in params.items():
+            if name not in self.params:
+                raise TypeError(f'{type(self).__name__} has no parameter {name!r}.')
+            if not isinstance(value, self.params[name]):
+                raise TypeError(f'Invalid type for {type(self).__name__}.{name}: {type(value).__name__}.')
+
+        for name, value in params.items():
+            self._set_param(name, value)
+
+        self.invalidate(set(params))
+
+    def _set_param(self, name, value):
+        setattr(self, name, value)
+
+    def invalidate(self, params):
+        """Drop the cached state that depends on the given parameters."""
+        pass
+
+    def frame_key(self, frame_index):
+        """State the output of the given frame depends on, besides the input frame and the parameters."""
+        return None
+
+    def __call__(self, ctx):
         raise NotImplementedError('Transform __call__ method must be implemented.')
 
 
 class Compose(BaseTransform):
+    # Pixel step of the quick comparison of input frames, only frames that
+    # match on this grid are compared in full
+    sample_step = 16
+
+    # Rows per band of the full comparison, which stops at the first band
+    # that differs
+    compare_rows = 128
+
     def __init__(self, transforms):
         super().__init__()
 
         self.transforms = transforms
-
-    def __call__(self, **kwargs):
-        input = kwargs
+        self.layout = None
+        self.layout_size = None
+        self.dynamic_transforms = []
+
+        # The previous input frame, frame keys and output. Screen recordings
+        # repeat frames while nothing moves on screen, and a repeated frame
+        # with the same frame keys is not composited again. Input frames are
+        # kept by reference, callers must not modify them afterwards.
+        self.last_input = None
+        self.copy_input = False
+        self.changed_row = 0
+        self.last_keys = None
+        self.last_ctx = None
+        self.reused_frames = 0
+        self.rendered_frames = 0
+
+    def compile(self, width, height, scale=1.0):
+        """Build the layout plan for input frames of the given size and scale.
+
+        The plan holds the static geometry (video size and frame rect), so the
+        per-frame path only has to run the time-varying transforms.
+        """
+        layout = FrameContext(frame_width=width, frame_height=height, scale=scale)
         for _, t in self.transforms.items():
-            input = t(**input)
-
-        return input
+            layout = t.plan(layout)
+
+        self.layout = layout
+        self.layout_size = (width, height, scale)
+        self.dynamic_transforms = [t for t in self.transforms.values() if not t.static]
+        self.copy_input = any(t.mutates_input for t in self.dynamic_transforms)
+        self.last_ctx = None
+        return layout
+
+    def reuse_info(self):
+        return {
+            'reused': self.reused_frames,
+            'rendered': self.rendered_frames,
+        }
+
+    def __call__(self, ctx):
+        height, width = ctx.input.shape[:2]
+        if self.layout_size != (width, height, ctx.scale):
+            self.compile(width, height, ctx.scale)
+
+        keys = [t.frame_key(ctx.frame_index) for t in self.dynamic_transforms]
+        if self._repeats_last_input(ctx.input) and keys == self.last_keys and self.last_ctx is not None:
+            # The output of the previous frame is still in place, as it is
+            # only overwritten by the next composite
+            self.reused_frames += 1
+            self.last_ctx.frame_index = ctx.frame_index
+            return self.last_ctx
+
+        self.rendered_frames += 1
+        self.last_keys = keys
+        self.last_ctx = None
+
+        layout = self.layout
+        ctx.video_width = layout.video_width
+        ctx.video_height = layout.video_height
+        ctx.frame_width = layout.frame_width
+        ctx.frame_height = layout.frame_height
+
+        for t in self.dynamic_transforms:
+            ctx = t(ctx)
+
+        self.last_ctx = ctx
+        return ctx
+
+    def _repeats_last_input(self, input):
+        """Check whether the input equals the previous one, and keep it for the next frame."""
+        last_input = self.last_input
+        step = self.sample_step
+        if (last_input is not None and last_input.shape == input.shape and last_input.dtype == input.dtype
+                and np.array_equal(last_input[::step, ::step], input[::step, ::step])
+                and (last_input is input or self._bands_equal(last_input, input))):
+            return True
+
+        # Only a transform drawing on the input would change the kept frame
+        self.last_input = input.copy() if self.copy_input else input
+        return False
+
+    def _bands_equal(self, a, b):
+        # Small changes like typing tend to repeat in the same place, so
+        # the band that differed last time is compared first
+        height = a.shape[0]
+        rows = self.compare_rows
+        start = self.changed_row
+        for y in list(range(start, height, rows)) + list(range(start - rows, -rows, -rows)):
+            y = max(0, y)
+            if cv2.norm(a[y:y + rows], b[y:y + rows], cv2.NORM_INF) != 0:
+                self.changed_row = y
+                return False
+
+        return True
+
+    def update(self, key, **params):
+        """Update the parameters of a transform in place.
+
+        The layout plan is only recompiled when a static transform changes.
+        """
+        transform = self.transforms[key]
+        transform.update(**params)
+        self.last_ctx = None
+
+        if transform.static and self.layout_size is not None:
+            self.compile(*self.layout_size)
 
     def __getitem__(self, key):
         return self.transforms.get(key)
@@ -35,13 +231,24 @@ class Compose(BaseTransform):
     def __setitem__(self, key, value):
         self.transforms[key] = value
 
+        # The plan is rebuilt lazily on the next frame
+        self.layout = None
+        self.layout_size = None
+        self.last_ctx = None
+
 
 class AspectRatio(BaseTransform):
+    static = True
+    params = {'aspect_ratio': (str, tuple, list)}
+
     def __init__(self, aspect_ratio):
         super().__init__()
 
         self.aspect_ratio = self._get_aspect_ratio(aspect_ratio)
 
+    def _set_param(self, name, value):
+        self.aspect_ratio = self._get_aspect_ratio(value)
+
     def _get_aspect_ratio(self, aspect_ratio):
         width, height = None, None
 
@@ -60,17 +267,15 @@ class AspectRatio(BaseTransform):
 
         return width, height
 
-    def __call__(self, **kwargs):
-        input = kwargs['input']
-        height, width = input.shape[:2]
+    def plan(self, layout):
+        width = layout.frame_width
+        height = layout.frame_height
         w_factor, h_factor = self.aspect_ratio
 
         if w_factor is None or h_factor is None:
-            kwargs['video_width'] = width
-            kwargs['video_height'] = height
-            kwargs['frame_width'] = width
-            kwargs['frame_height'] = height
-            return kwargs
+            layout.video_width = width
+            layout.video_height = height
+            return layout
 
         ratio = w_factor / h_factor
 
@@ -81,42 +286,50 @@ class AspectRatio(BaseTransform):
             new_width = int(height * ratio)
             new_height = height
 
-        kwargs['video_width'] = new_width
-        kwargs['video_height'] = new_height
-        kwargs['frame_width'] = width
-        kwargs['frame_height'] = height
+        layout.video_width = new_width
+        layout.video_height = new_height
 
-        return kwargs
+        return layout
+
+    def __call__(self, ctx):
+        ctx.frame_height, ctx.frame_width = ctx.input.shape[:2]
+
+        return self.plan(ctx)
 
 
 class Padding(BaseTransform):
+    static = True
+    params = {'padding': (int, tuple, list)}
+
     def __init__(self, padding):
         super().__init__()
 
         self.padding = padding
 
-    def __call__(self, **kwargs):
-        input = kwargs['input']
-        video_width = kwargs['video_width']
-        video_height = kwargs['video_height']
+    def plan(self, layout):
+        video_width = layout.video_width
+        video_height = layout.video_height
 
-        frame_height, frame_width = input.shape[:2]
+        frame_width = layout.frame_width
+        frame_height = layout.frame_height
         gap_x, gap_y = max(0, (video_width - frame_width) // 2), max(0, (video_height - frame_height) // 2)
         pad_x, pad_y = 0, 0
 
         if isinstance(self.padding, (list, tuple)):
             if len(self.padding) == 2:
                 pad_x, pad_y = self.padding[0]
+                pad_x, pad_y = round(pad_x * layout.scale), round(pad_y * layout.scale)
             else:
                 raise Exception('Invalid padding format.')
         elif isinstance(self.padding, int):
+            padding = round(self.padding * layout.scale)
             if gap_x > gap_y:
-                pad_y = self.padding
+                pad_y = padding
                 new_height = video_height - 2 * pad_y
                 new_width = int(new_height * frame_width / frame_height)
                 pad_x = max(0, (video_width - new_width) // 2)
             else:
-                pad_x = self.padding
+                pad_x = padding
                 new_width = video_width - 2 * pad_x
                 new_height = int(new_width * frame_height / frame_width)
                 pad_y = max(0, (video_height - new_height) // 2)
@@ -126,13 +339,20 @@ class Padding(BaseTransform):
         new_width = max(1, video_width - 2 * pad_x)
         new_height = max(1, video_height - 2 * pad_y)
 
-        kwargs['frame_width'] = new_width
-        kwargs['frame_height'] = new_height
+        layout.frame_width = new_width
+        layout.frame_height = new_height
+
+        return layout
+
+    def __call__(self, ctx):
+        ctx.frame_height, ctx.frame_width = ctx.input.shape[:2]
 
-        return kwargs
+        return self.plan(ctx)
 
 
 class Inset(BaseTransform):
+    params = {'inset': (int, tuple, list), 'color': (tuple, list)}
+
     def __init__(self, inset, color=(0, 122, 222)):
         super().__init__()
 
@@ -140,57 +360,84 @@ class Inset(BaseTransform):
         self.color = color
         self.inset_frame = None
 
-    def __call__(self, **kwargs):
-        if len(kwargs) >= 3:
-            input = kwargs['input']
-            height, width = input.shape[:2]
-
-            inset_left, inset_top, inset_right, inset_bottom = 0, 0, 0, 0
-
-            if isinstance(self.inset, (list, tuple)):
-                if len(self.inset) == 2:
-                    inset_left, inset_right = self.inset[0]
-                    inset_top, inset_bottom = self.inset[1]
-                elif len(self.inset) == 4:
-                    inset_left, inset_top, inset_right, inset_bottom = self.inset
-                else:
-                    raise Exception()
-            elif isinstance(self.inset, int):
-                inset_top, inset_bottom = self.inset, self.inset
-                inset_left = int(inset_top * width / height)
-                inset_right = inset_left
+    def invalidate(self, params):
+        if 'color' in params:
+            self.inset_frame = None
+
+    def __call__(self, ctx):
+        input = ctx.input
+        height, width = input.shape[:2]
+
+        inset_left, inset_top, inset_right, inset_bottom = 0, 0, 0, 0
+
+        if isinstance(self.inset, (list, tuple)):
+            if len(self.inset) == 2:
+                inset_left, inset_right = self.inset[0]
+                inset_top, inset_bottom = self.inset[1]
+            elif len(self.inset) == 4:
+                inset_left, inset_top, inset_right, inset_bottom = self.inset
             else:
                 raise Exception()
 
-            new_width = width - inset_left - inset_right
-            new_height = height - inset_top - inset_bottom
+            inset_left, inset_top = round(inset_left * ctx.scale), round(inset_top * ctx.scale)
+            inset_right, inset_bottom = round(inset_right * ctx.scale), round(inset_bottom * ctx.scale)
+        elif isinstance(self.inset, int):
+            inset_top = inset_bottom = round(self.inset * ctx.scale)
+            inset_left = int(inset_top * width / height)
+            inset_right = inset_left
+        else:
+            raise Exception()
+
+        new_width = width - inset_left - inset_right
+        new_height = height - inset_top - inset_bottom
 
-            if self.inset_frame is None or self.inset_frame.shape[0] != height or self.inset_frame.shape[1] != width:
-                self.inset_frame = np.full_like(input, fill_value=self.color)
+        if self.inset_frame is None or self.inset_frame.shape[0] != height or self.inset_frame.shape[1] != width:
+            self.inset_frame = np.full_like(input, fill_value=self.color)
 
-            resized_frame = cv2.resize(input, (new_width, new_height))
-            self.inset_frame[inset_top:inset_top+new_height, inset_left:inset_left+new_width, :] = resized_frame
+        resized_frame = cv2.resize(input, (new_width, new_height))
+        self.inset_frame[inset_top:inset_top+new_height, inset_left:inset_left+new_width, :] = resized_frame
 
-            kwargs['input'] = self.inset_frame
-            return kwargs
+        ctx.input = self.inset_frame
+        return ctx
 
 
 class Roundness(BaseTransform):
-    def __init__(self, radius=10):
+    params = {'radius': int, 'quantize': int, 'cache_bytes': int}
+
+    def __init__(self, radius=10, quantize=0, cache_bytes=64 * 1024 * 1024):
         super().__init__()
         self.radius = radius
 
-    def __call__(self, **kwargs):
-        input = kwargs['input']
-        zoom_factor = kwargs.get('zoom_factor', 1)
-        width = kwargs.get('frame_width', input.shape[1])
-        height = kwargs.get('frame_height', input.shape[0])
-        rounded_corners = {'top_left': True, 'top_right': True, 'bottom_right': True, 'bottom_left': True}
-
-        if 'mask_rounded_corners' in kwargs:
-            rounded_corners = kwargs['mask_rounded_corners']
-
-        r = int(zoom_factor * self.radius) if zoom_factor > 1 else self.radius
+        # Grid step (in pixels) zoomed radii are snapped to, 0 disables it.
+        # Corner masks only depend on the radius, snapping it makes frames
+        # of a zoom ramp share them.
+        self.quantize = quantize
+
+        # LRU cache of masks, bounded by their total size in bytes
+        self.cache_bytes = cache_bytes
+        self.masks = OrderedDict()
+        self.masks_nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def cache_info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.masks),
+            'nbytes': self.masks_nbytes,
+            'max_nbytes': self.cache_bytes,
+        }
+
+    def clear_cache(self):
+        self.masks.clear()
+        self.masks_nbytes = 0
+
+    def invalidate(self, params):
+        # Masks are keyed on the radius, so they stay valid when it changes
+        self._evict()
+
+    def _create_mask(self, width, height, r, rounded_corners):
         if r > 0:
             # Create a mask
             mask = np.zeros(shape=(height, width), dtype=np.uint8)
@@ -221,8 +468,103 @@ class Roundness(BaseTransform):
         else:
             mask = np.full(shape=(height, width), fill_value=255, dtype=np.uint8)
 
-        kwargs['mask'] = mask
-        return kwargs
+        return mask
+
+    def _get_mask(self, width, height, r, rounded_corners):
+        key = (
+            width, height, r,
+            rounded_corners['top_left'], rounded_corners['top_right'],
+            rounded_corners['bottom_right'], rounded_corners['bottom_left'],
+        )
+        mask = self.masks.get(key)
+        if mask is not None:
+            self.masks.move_to_end(key)
+            self.hits += 1
+            return mask
+
+        self.misses += 1
+        mask = self._create_mask(width, height, r, rounded_corners)
+        mask.setflags(write=False)
+
+        self._put(key, mask)
+        return mask
+
+    def _get_corner_masks(self, r, rounded_corners):
+        """Return the r x r masks of the pixels outside each rounded corner.
+
+        A mask only differs from a full rectangle within its corners, and
+        the corners do not depend on the frame size. Square corners have no
+        mask (None).
+        """
+        flags = (
+            rounded_corners['top_left'], rounded_corners['top_right'],
+            rounded_corners['bottom_right'], rounded_corners['bottom_left'],
+        )
+        key = ('corners', r) + flags
+        corner_masks = self.masks.get(key)
+        if corner_masks is not None:
+            self.masks.move_to_end(key)
+            self.hits += 1
+            return corner_masks
+
+        self.misses += 1
+        size = 2 * r + 2
+        mask = cv2.bitwise_not(self._create_mask(size, size, r, rounded_corners))
+        corner_masks = tuple(
+            np.ascontiguousarray(corner) if rounded else None
+            for corner, rounded in zip((mask[:r, :r], mask[:r, -r:], mask[-r:, -r:], mask[-r:, :r]), flags)
+        )
+        for corner in corner_masks:
+            if corner is not None:
+                corner.setflags(write=False)
+
+        self._put(key, corner_masks)
+        return corner_masks
+
+    def _put(self, key, mask):
+        self.masks[key] = mask
+        self.masks_nbytes += self._nbytes(mask)
+        self._evict(keep=1)
+
+    def _evict(self, keep=0):
+        while self.masks_nbytes > self.cache_bytes and len(self.masks) > keep:
+            _, evicted = self.masks.popitem(last=False)
+            self.masks_nbytes -= self._nbytes(evicted)
+
+    @staticmethod
+    def _nbytes(mask):
+        if isinstance(mask, tuple):
+            return sum(corner.nbytes for corner in mask if corner is not None)
+
+        return mask.nbytes
+
+    def __call__(self, ctx):
+        input = ctx.input
+        zoom_factor = ctx.zoom_factor
+        width = ctx.frame_width if ctx.frame_width is not None else input.shape[1]
+        height = ctx.frame_height if ctx.frame_height is not None else input.shape[0]
+        rounded_corners = {'top_left': True, 'top_right': True, 'bottom_right': True, 'bottom_left': True}
+
+        if ctx.mask_rounded_corners is not None:
+            rounded_corners = ctx.mask_rounded_corners
+
+        radius = round(self.radius * ctx.scale)
+        r = int(zoom_factor * radius) if zoom_factor > 1 else radius
+
+        if self.quantize > 0 and zoom_factor > 1 and r > 0:
+            # The radius changes on every frame of a zoom ramp, so snap it
+            r = max(self.quantize, int(round(r / self.quantize)) * self.quantize)
+
+        if r <= 0:
+            return ctx
+
+        if 2 * r <= min(width, height):
+            # Only the corners are masked, see Background
+            ctx.corner_masks = self._get_corner_masks(r, rounded_corners)
+            return ctx
+
+        ctx.mask = self._get_mask(width, height, r, rounded_corners)
+        return ctx
 
 
 class ZoomPosition(Enum):
@@ -237,11 +579,34 @@ class ZoomPosition(Enum):
     CENTER = auto()
 
 
+# Rounded-corner flags of the zoomed frame, indexed by a 4-bit code
+# (top_left, top_right, bottom_right, bottom_left from the lowest bit)
+ROUNDED_CORNERS = tuple(
+    {
+        'top_left': bool(code & 1),
+        'top_right': bool(code & 2),
+        'bottom_right': bool(code & 4),
+        'bottom_left': bool(code & 8),
+    }
+    for code in range(16)
+)
+
+
 class Zoom(BaseTransform):
+    params = {
+        'click_data': list,
+        'fps': (int, float),
+        'frame_times': (list, np.ndarray, type(None)),
+        'zoom_in_duration': (int, float),
+        'zoom_out_duration': (int, float),
+        'zoom_factor': (int, float),
+    }
+
     def __init__(
         self,
         click_data,
         fps,
+        frame_times=None,
         zoom_in_duration=1.0,
         zoom_out_duration=1.0,
         zoom_factor=2.0
@@ -256,13 +621,236 @@ class Zoom(BaseTransform):
         self.zoom_factor = zoom_factor
         self.fps = fps
 
+        # Time of each frame from the start of the video, variable frame
+        # rate videos drift from frame_index / fps
+        self.frame_times = None if frame_times is None else np.asarray(frame_times, dtype=np.float64)
+
         self.corner_ratio = 0.3
 
+        # Per-frame schedule, see _build_schedule() and plan()
+        self.zoom_factors = None
+        self.positions = None
+        self.shift_x = None
+        self.shift_y = None
+        self.corner_codes = None
+        self.frame_table = None
+        self.identity_row = None
+        self.geometry = None
+        self.layout = None
+
+        self._build_schedule()
+
+    def frame_key(self, frame_index):
+        if self.frame_table is not None and 0 <= frame_index < len(self.frame_table):
+            return float(self.zoom_factors[frame_index]), tuple(self.frame_table[frame_index].tolist())
+
+        return 1, self.identity_row
+
+    def _set_param(self, name, value):
+        if name == 'frame_times' and value is not None:
+            value = np.asarray(value, dtype=np.float64)
+        setattr(self, name, value)
+
+    def invalidate(self, params):
+        # Every parameter feeds the schedule, but the layout is unchanged
+        self.clicked_indices = [click['frame_index'] for click in self.click_data]
+        self._build_schedule()
+
+        if self.layout is not None:
+            self.plan(self.layout)
+
+    def _build_schedule(self):
+        """Precompute the zoom factor and zoom position of every frame.
+
+        Frames past the end of the last click are not zoomed, so the arrays
+        only cover the frames up to there. Click durations and zoom progress
+        follow the frame times when they are known, and fps otherwise.
+        """
+        num_clicks = len(self.click_data)
+        if num_clicks == 0:
+            self.zoom_factors = np.ones(0, dtype=np.float64)
+            self.positions = np.zeros(0, dtype=np.int8)
+            return
+
+        starts = np.array(self.clicked_indices, dtype=np.float64)
+        durations = np.array([click['duration'] for click in self.click_data], dtype=np.float64)
+        if self.frame_times is not None and len(self.frame_times):
+            times = self.frame_times
+            start_times = times[np.clip(starts.astype(np.int64), 0, len(times) - 1)]
+
+            # A click lasts over the frames shown before its end time
+            ends = np.searchsorted(times, start_times + durations - 1e-4, side='left')
+            durations_in_frames = np.maximum(0, ends - starts)
+        else:
+            times = None
+            durations_in_frames = np.array([int(click['duration'] * self.fps) for click in self.click_data])
+
+        click_positions = np.array([
+            self._calculate_zoom_position(click['x'], click['y']).value
+            for click in self.click_data
+        ], dtype=np.int8)
+
+        num_frames = max(0, int(np.ceil((starts + durations_in_frames).max())))
+        frame_indices = np.arange(num_frames)
+
+        # Find the largest less equal click frame index than each frame index
+        indices = np.searchsorted(starts, frame_indices, side='right') - 1
+        clicked = indices >= 0
+        indices = np.maximum(indices, 0)
+
+        clicked_frame_indices = starts[indices]
+        duration = durations[indices]
+        in_range = (
+            clicked
+            & (clicked_frame_indices <= frame_indices)
+            & (frame_indices < clicked_frame_indices + durations_in_frames[indices])
+        )
+
+        # Calculate the elapsed time and the stage of zoom
+        if times is not None:
+            elapsed_time = times[np.minimum(frame_indices, len(times) - 1)] - start_times[indices]
+        else:
+            elapsed_time = (frame_indices - clicked_frame_indices) / self.fps
+        zooming_in = elapsed_time <= self.zoom_in_duration
+        zooming_out = ~zooming_in & (elapsed_time >= duration - self.zoom_out_duration)
+
+        zoom_in_progress = elapsed_time / self.zoom_in_duration
+        zoom_out_progress = (elapsed_time - (duration - self.zoom_out_duration)) / self.zoom_out_duration
+        zoom_factors = np.select(
+            [zooming_in, zooming_out],
+            [
+                1 + (self.zoom_factor - 1) * self.ease_in_out_quad(zoom_in_progress),
+                self.zoom_factor - (self.zoom_factor - 1) * self.ease_in_out_quad(zoom_out_progress),
+            ],
+            default=self.zoom_factor,
+        )
+
+        self.zoom_factors = np.where(in_range, zoom_factors, 1.0)
+        self.positions = np.where(clicked, click_positions[indices], ZoomPosition.CENTER.value).astype(np.int8)
+
+    def changed_frames(self, zoom_factors, positions):
+        """Return the indices of the frames zoomed differently than in the given schedule."""
+        num_frames = max(len(zoom_factors), len(self.zoom_factors))
+        old_zoom_factors = np.ones(num_frames)
+        old_zoom_factors[:len(zoom_factors)] = zoom_factors
+        new_zoom_factors = np.ones(num_frames)
+        new_zoom_factors[:len(self.zoom_factors)] = self.zoom_factors
+        old_positions = np.full(num_frames, ZoomPosition.CENTER.value, dtype=np.int8)
+        old_positions[:len(positions)] = positions
+        new_positions = np.full(num_frames, ZoomPosition.CENTER.value, dtype=np.int8)
+        new_positions[:len(self.positions)] = self.positions
+
+        # The zoom position does not matter for frames that are not zoomed
+        zoomed = (old_zoom_factors != 1) | (new_zoom_factors != 1)
+        changed = (old_zoom_factors != new_zoom_factors) | (zoomed & (old_positions != new_positions))
+        return np.flatnonzero(changed).tolist()
+
+    def plan(self, layout):
+        """Turn the zoom schedule into per-frame geometry for this layout."""
+        video_width = layout.video_width
+        video_height = layout.video_height
+        frame_width = layout.frame_width
+        frame_height = layout.frame_height
+        self.layout = FrameContext(
+            video_width=video_width,
+            video_height=video_height,
+            frame_width=frame_width,
+            frame_height=frame_height
+        )
+
+        left_half_frame_width = frame_width // 2
+        right_half_frame_width = frame_width - left_half_frame_width
+        top_half_frame_height = frame_height // 2
+        bottom_half_frame_height = frame_height - top_half_frame_height
+
+        new_frame_widths = (self.zoom_factors * frame_width).astype(np.int64)
+        new_frame_heights = (self.zoom_factors * frame_height).astype(np.int64)
+
+        left_half_new_frame_widths = new_frame_widths // 2
+        right_half_new_frame_widths = new_frame_widths - left_half_new_frame_widths
+        top_half_new_frame_heights = new_frame_heights // 2
+        bottom_half_new_frame_heights = new_frame_heights - top_half_new_frame_heights
+
+        positions = self.positions
+        shift_left = np.isin(positions, (ZoomPosition.TOP_LEFT.value, ZoomPosition.LEFT.value, ZoomPosition.BOTTOM_LEFT.value))
+        shift_right = np.isin(positions, (ZoomPosition.TOP_RIGHT.value, ZoomPosition.RIGHT.value, ZoomPosition.BOTTOM_RIGHT.value))
+        shift_top = np.isin(positions, (ZoomPosition.TOP_LEFT.value, ZoomPosition.TOP.value, ZoomPosition.TOP_RIGHT.value))
+        shift_bottom = np.isin(positions, (ZoomPosition.BOTTOM_LEFT.value, ZoomPosition.BOTTOM.value, ZoomPosition.BOTTOM_RIGHT.value))
+
+        self.shift_x = np.select(
+            [shift_left, shift_right],
+            [left_half_new_frame_widths - left_half_frame_width, right_half_frame_width - right_half_new_frame_widths],
+            default=0,
+        )
+        self.shift_y = np.select(
+            [shift_top, shift_bottom],
+            [top_half_new_frame_heights - top_half_frame_height, bottom_half_frame_height - bottom_half_new_frame_heights],
+            default=0,
+        )
+
+        video_cx, video_cy = video_width // 2, video_height // 2
+        frame_x1 = video_cx + self.shift_x - new_frame_widths // 2
+        frame_y1 = video_cy + self.shift_y - new_frame_heights // 2
+        self.corner_codes = self._corner_codes(
+            frame_x1, frame_y1, new_frame_widths, new_frame_heights, video_width, video_height)
+
+        self.frame_table = np.stack(
+            [new_frame_widths, new_frame_heights, frame_x1, frame_y1, self.corner_codes], axis=1)
+
+        # Geometry of the frames without any zoom
+        frame_x1 = video_cx - frame_width // 2
+        frame_y1 = video_cy - frame_height // 2
+        corner_code = int(self._corner_codes(
+            frame_x1, frame_y1, frame_width, frame_height, video_width, video_height))
+        self.identity_row = (frame_width, frame_height, frame_x1, frame_y1, corner_code)
+
+        self.geometry = (video_width, video_height)
+        return layout
+
+    @staticmethod
+    def _corner_codes(frame_x1, frame_y1, frame_width, frame_height, video_width, video_height):
+        # A corner is only rounded while it is inside the video
+        out_left = np.asarray(frame_x1 < 0)
+        out_top = np.asarray(frame_y1 < 0)
+        out_right = np.asarray(frame_x1 + frame_width > video_width)
+        out_bottom = np.asarray(frame_y1 + frame_height > video_height)
+
+        return (
+            ~(out_left | out_top) * 1
+            + ~(out_top | out_right) * 2
+            + ~(out_right | out_bottom) * 4
+            + ~(out_left | out_bottom) * 8
+        )
+
+    @staticmethod
+    def _crop_and_scale(input, new_frame_width, new_frame_height, crop_xmin, crop_ymin, crop_width, crop_height):
+        """Resample only the visible part of the zoomed frame.
+
+        Samples the same positions as resizing the input to the zoomed size
+        and cropping it, without allocating the zoomed frame. The affine map
+        is the inverse of the pixel-center mapping used by cv2.resize, so the
+        framing is identical, but warpAffine rounds sample positions to 1/32
+        of a pixel, so on sharp edges pixel values differ from the resize by
+        up to 8 levels (see tests/test_zoom.py).
+        """
+        input_height, input_width = input.shape[:2]
+        scale_x = input_width / new_frame_width
+        scale_y = input_height / new_frame_height
+
+        matrix = np.array([
+            [scale_x, 0, (crop_xmin + 0.5) * scale_x - 0.5],
+            [0, scale_y, (crop_ymin + 0.5) * scale_y - 0.5],
+        ], dtype=np.float64)
+
+        return cv2.warpAffine(
+            input, matrix, (crop_width, crop_height),
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_REPLICATE
+        )
+
     def ease_in_out_quad(self, t):
-        """Easing function for smooth zoom transitions."""
-        if t < 0.5:
-            return 2 * t * t
-        return -1 + (4 - 2 * t) * t
+        """Easing function for smooth zoom transitions, applied element-wise."""
+        return np.where(t < 0.5, 2 * t * t, -1 + (4 - 2 * t) * t)
 
     def _calculate_zoom_position(self, click_x, click_y):
         corner_ratio = self.corner_ratio
@@ -291,143 +879,49 @@ class Zoom(BaseTransform):
             else:
                 return ZoomPosition.BOTTOM_RIGHT
 
-    def __call__(self, **kwargs):
-        input = kwargs['input']
-        video_width = kwargs['video_width']
-        video_height = kwargs['video_height']
-        frame_width = kwargs['frame_width']
-        frame_height = kwargs['frame_height']
-        frame_index = kwargs['frame_index']
-
-        shift_x = 0
-        shift_y = 0
-
-        # Find the largest less equal click frame index than the current index
-        index = find_largest_leq_sorted(self.clicked_indices, frame_index)
-
-        if index >= 0:
-            click = self.click_data[index]
-
-            # If the current frame is within the valid range of the click
-            rel_clicked_x = click['x']
-            rel_clicked_y = click['y']
-            clicked_frame_index = click['frame_index']
-            duration = click['duration']
-            duration_in_frames = int(duration * self.fps)
-
-            if clicked_frame_index <= frame_index < clicked_frame_index + duration_in_frames:
-                # Calculate the elapsed time and the stage of zoom
-                elapsed_time = (frame_index - clicked_frame_index) / self.fps
-                if elapsed_time <= self.zoom_in_duration:
-                    # Zooming in
-                    progress = elapsed_time / self.zoom_in_duration
-                    factor = self.ease_in_out_quad(progress)
-                    zoom_factor = 1 + (self.zoom_factor - 1) * factor
-                elif elapsed_time >= duration - self.zoom_out_duration:
-                    # Zooming out
-                    progress = (elapsed_time - (duration - self.zoom_out_duration)) / self.zoom_out_duration
-                    zoom_factor = self.zoom_factor - (self.zoom_factor - 1) * self.ease_in_out_quad(progress)
-                else:
-                    # Maintain zoom
-                    zoom_factor = self.zoom_factor
-            else:
-                zoom_factor = 1
-
-            new_frame_width = int(zoom_factor * frame_width)
-            new_frame_height = int(zoom_factor * frame_height)
-
-            left_half_new_frame_width = new_frame_width // 2
-            right_half_new_frame_width = new_frame_width - left_half_new_frame_width
-            top_half_new_frame_height = new_frame_height // 2
-            bottom_half_new_frame_height = new_frame_height - top_half_new_frame_height
-
-            left_half_frame_width = frame_width // 2
-            right_half_frame_width = frame_width - left_half_frame_width
-            top_half_frame_height = frame_height // 2
-            bottom_half_frame_height = frame_height - top_half_frame_height
-
-            position = self._calculate_zoom_position(rel_clicked_x, rel_clicked_y)
-
-            if position == ZoomPosition.TOP_LEFT:
-                shift_x = left_half_new_frame_width - left_half_frame_width
-                shift_y = top_half_new_frame_height - top_half_frame_height
-            elif position == ZoomPosition.TOP:
-                shift_x = 0
-                shift_y = top_half_new_frame_height - top_half_frame_height
-            elif position == ZoomPosition.TOP_RIGHT:
-                shift_x = right_half_frame_width - right_half_new_frame_width
-                shift_y = top_half_new_frame_height - top_half_frame_height
-            elif position == ZoomPosition.RIGHT:
-                shift_x = right_half_frame_width - right_half_new_frame_width
-                shift_y = 0
-            elif position == ZoomPosition.BOTTOM_RIGHT:
-                shift_x = right_half_frame_width - right_half_new_frame_width
-                shift_y = bottom_half_frame_height - bottom_half_new_frame_height
-            elif position == ZoomPosition.BOTTOM:
-                shift_x = 0
-                shift_y = bottom_half_frame_height - bottom_half_new_frame_height
-            elif position == ZoomPosition.BOTTOM_LEFT:
-                shift_x = left_half_new_frame_width - left_half_frame_width
-                shift_y = bottom_half_frame_height - bottom_half_new_frame_height
-            elif position == ZoomPosition.LEFT:
-                shift_x = left_half_new_frame_width - left_half_frame_width
-                shift_y = 0
-            else:
-                # center
-                shift_x = 0
-                shift_y = 0
-        else:
-            shift_x = 0
-            shift_y = 0
-            new_frame_width = frame_width
-            new_frame_height = frame_height
-            zoom_factor = 1
+    def __call__(self, ctx):
+        input = ctx.input
+        frame_index = ctx.frame_index
 
-        resized_frame = cv2.resize(input, (new_frame_width, new_frame_height))
+        if self.frame_table is None:
+            self.plan(ctx)
 
-        video_cx, video_cy = video_width // 2, video_height // 2
-        frame_x1 = video_cx + shift_x - new_frame_width // 2
-        frame_y1 = video_cy + shift_y - new_frame_height // 2
+        video_width, video_height = self.geometry
+
+        if 0 <= frame_index < len(self.frame_table):
+            zoom_factor = float(self.zoom_factors[frame_index])
+            new_frame_width, new_frame_height, frame_x1, frame_y1, corner_code = self.frame_table[frame_index].tolist()
+        else:
+            zoom_factor = 1
+            new_frame_width, new_frame_height, frame_x1, frame_y1, corner_code = self.identity_row
 
         x1 = max(0, frame_x1)
         y1 = max(0, frame_y1)
         x2 = min(video_width, frame_x1 + new_frame_width)
         y2 = min(video_height, frame_y1 + new_frame_height)
 
-        crop_xmin = max(0, new_frame_width // 2 - video_cx - shift_x)
-        crop_ymin = max(0, new_frame_height // 2 - video_cy - shift_y)
+        crop_xmin = max(0, -frame_x1)
+        crop_ymin = max(0, -frame_y1)
         crop_width = x2 - x1
         crop_height = y2 - y1
-        cropped_frame = resized_frame[crop_ymin:crop_ymin+crop_height, crop_xmin:crop_xmin+crop_width, :]
-
-        # Modify the rounded border mask
-        rounded_corners = {'top_left': True, 'top_right': True, 'bottom_right': True, 'bottom_left': True}
-        if frame_x1 < 0:
-            rounded_corners['top_left'] = False
-            rounded_corners['bottom_left'] = False
-
-        if frame_y1 < 0:
-            rounded_corners['top_left'] = False
-            rounded_corners['top_right'] = False
 
-        if frame_x1 + new_frame_width > video_width:
-            rounded_corners['top_right'] = False
-            rounded_corners['bottom_right'] = False
-
-        if frame_y1 + new_frame_height > video_height:
-            rounded_corners['bottom_right'] = False
-            rounded_corners['bottom_left'] = False
+        if crop_width == new_frame_width and crop_height == new_frame_height:
+            cropped_frame = cv2.resize(input, (new_frame_width, new_frame_height))
+        else:
+            cropped_frame = self._crop_and_scale(
+                input, new_frame_width, new_frame_height, crop_xmin, crop_ymin, crop_width, crop_height)
 
-        kwargs['mask_rounded_corners'] = rounded_corners
+        # Corners cut off by the video edges are not rounded
+        ctx.mask_rounded_corners = ROUNDED_CORNERS[corner_code]
 
-        kwargs['input'] = cropped_frame
-        kwargs['frame_width'] = crop_width
-        kwargs['frame_height'] = crop_height
-        kwargs['x_offset'] = x1
-        kwargs['y_offset'] = y1
-        kwargs['zoom_factor'] = zoom_factor
+        ctx.input = cropped_frame
+        ctx.frame_width = crop_width
+        ctx.frame_height = crop_height
+        ctx.x_offset = x1
+        ctx.y_offset = y1
+        ctx.zoom_factor = zoom_factor
 
-        return kwargs
+        return ctx
 
 
 class Cursor(BaseTransform):
@@ -436,9 +930,19 @@ class Cursor(BaseTransform):
 
         self.size = size
         self.move_data = move_data
-        self.cursors = self._load()
 
-    def _load(self):
+        # Cursor images by their size in pixels, see _get_cursors()
+        self.cursors = {}
+
+    def _get_cursors(self, scale):
+        # The cursor is scaled with the frame, like every pixel-sized parameter
+        size = max(1, round(self.size * scale))
+        if size not in self.cursors:
+            self.cursors[size] = self._load(size)
+
+        return self.cursors[size]
+
+    def _load(self, size):
         system = platform.system().lower()
 
         if system == 'windows':
@@ -450,34 +954,43 @@ class Cursor(BaseTransform):
         else:
             raise Exception()
 
-        arrow_image = cv2.imread(f':/images/cursor/{sub_folder}/cursor.png', cv2.IMREAD_UNCHANGED)
+        # Read from the package rather than the Qt resources, so the
+        # transform also works in processes without Qt
+        arrow_image = cv2.imread(str(CURSOR_DIR / sub_folder / 'cursor.png'), cv2.IMREAD_UNCHANGED)
         height, width = arrow_image.shape[:2]
         if height > width:
-            new_height = self.size
-            new_width = int(self.size * width / height)
+            new_height = size
+            new_width = max(1, int(size * width / height))
         else:
-            new_width = self.size
-            new_height = int(self.size * height / width)
+            new_width = size
+            new_height = max(1, int(size * height / width))
 
-        arrow_image = cv2.resize(arrow_image, (new_width, new_height))
+        arrow_image = cv2.resize(arrow_image, (new_width, new_height), interpolation=cv2.INTER_AREA)
 
-        pointing_hand = cv2.imread(f':/images/cursor/{sub_folder}/pointinghand.png', cv2.IMREAD_UNCHANGED)
-        pointing_hand = cv2.resize(pointing_hand, (self.size, self.size))
+        pointing_hand = cv2.imread(str(CURSOR_DIR / sub_folder / 'pointinghand.png'), cv2.IMREAD_UNCHANGED)
+        pointing_hand = cv2.resize(pointing_hand, (size, size), interpolation=cv2.INTER_AREA)
 
         return {'arrow': arrow_image, 'pointing_hand': pointing_hand}
 
-    def _blend(self, image, x, y):
+    def frame_key(self, frame_index):
+        if frame_index < len(self.move_data):
+            return tuple(self.move_data[frame_index])
+
+    def _blend(self, image, x, y, scale):
+        """Draw the cursor on a copy of the image, with its tip at the relative position (x, y)."""
         if x is None or y is None:
             return image
 
         height, width = image.shape[:2]
 
+        # The tip of the arrow is the top-left pixel of its image, so it
+        # needs no offset at any scale
         x, y = int(x * width), int(y * height)
 
-        if x < 0 or y < 0:
+        if x < 0 or y < 0 or x >= width or y >= height:
             return image
 
-        arrow_image = self.cursors['arrow']
+        arrow_image = self._get_cursors(scale)['arrow']
         arrow_h, arrow_w = arrow_image.shape[:2]
         arrow_bgr = arrow_image[:, :, :3]
         arrow_mask = arrow_image[:, :, 3]
@@ -488,6 +1001,10 @@ class Cursor(BaseTransform):
         if x + arrow_w > width:
             arrow_w = width - x
 
+        # The input may be a decoded frame shared with the caches, which
+        # must not be drawn on
+        image = image.copy()
+
         # Get the region of interest from the input frame
         roi = image[y:y+arrow_h, x:x+arrow_w]
 
@@ -500,42 +1017,53 @@ class Cursor(BaseTransform):
 
         blended = cv2.add(masked_arrow, masked_roi)
 
-        # Update the input frame with the blended result
+        # Update the copied frame with the blended result
         image[y:y+arrow_h, x:x+arrow_w] = blended
         return image
 
-    def __call__(self, **kwargs):
-        input = kwargs['input']
-        frame_index = kwargs['frame_index']
+    def __call__(self, ctx):
+        input = ctx.input
+        frame_index = ctx.frame_index
 
         if frame_index < len(self.move_data):
             relative_mouse_x, relative_mouse_y, _ = self.move_data[frame_index]
-            kwargs['input'] = self._blend(input, relative_mouse_x, relative_mouse_y)
+            ctx.input = self._blend(input, relative_mouse_x, relative_mouse_y, ctx.scale)
 
-        return kwargs
+        return ctx
 
 
 class Shadow(BaseTransform):
     def __init__(self):
         super().__init__()
 
-    def __call__(self, **kwargs):
-        return kwargs
+    def __call__(self, ctx):
+        return ctx
 
 
 class Background(BaseTransform):
+    params = {'background': dict}
+
     def __init__(self, background):
         super().__init__()
 
         self.background = background
         self.background_image = None
 
+        # Composited frames are written into a persistent buffer. Only the
+        # rect the previous frame covered has to be restored from the
+        # background, so callers must copy the output to keep it.
+        self.output = None
+        self.dirty_rect = None
+
+    def invalidate(self, params):
+        # The output buffer is kept and fully restored on the next frame
+        self.background_image = None
+
     def _create_background_image(self, background, width, height):
         if background['type'] == 'wallpaper':
             index = background['value']
-            background_path = f'/home/tamnv/Projects/exp/screenwiz/screenwiz/resources/images/wallpaper/full/gradient-wallpaper-{index:04d}.png'
-            background_image = cv2.imread(background_path)
-            background_image = cv2.resize(background_image, (width, height))
+            background_path = str(WALLPAPER_DIR / f'gradient-wallpaper-{index:04d}.png')
+            background_image = ImageAssets.get(background_path, width, height)
         elif background['type'] == 'gradient':
             pass
         elif background['type'] == 'color':
@@ -545,44 +1073,63 @@ class Background(BaseTransform):
 
         return background_image
 
-    def __call__(self, **kwargs):
-        input = kwargs['input']
-        width = kwargs['video_width']
-        height = kwargs['video_height']
-        frame_width = kwargs['frame_width']
-        frame_height = kwargs['frame_height']
-        x_offset = kwargs.get('x_offset', 0)
-        y_offset = kwargs.get('y_offset', 0)
+    def _restore_corners(self, corner_masks, x1, y1, x2, y2):
+        """Show the background outside the rounded corners of the frame rect."""
+        # Top-left, top-right, bottom-right and bottom-left
+        for corner_mask, left, top in zip(corner_masks, (True, False, False, True), (True, True, False, False)):
+            if corner_mask is None:
+                continue
+
+            r = corner_mask.shape[0]
+            x = x1 if left else x2 - r
+            y = y1 if top else y2 - r
+            cv2.copyTo(self.background_image[y:y + r, x:x + r], corner_mask, self.output[y:y + r, x:x + r])
+
+    def __call__(self, ctx):
+        input = ctx.input
+        width = ctx.video_width
+        height = ctx.video_height
+        frame_width = ctx.frame_width
+        frame_height = ctx.frame_height
+        x_offset = ctx.x_offset
+        y_offset = ctx.y_offset
 
         if input.shape[0] != frame_height or input.shape[1] != frame_width:
             input = cv2.resize(input, (frame_width, frame_height))
 
         if self.background_image is None or self.background_image.shape[0] != height or self.background_image.shape[1] != width:
             self.background_image = self._create_background_image(self.background, width, height)
+            self.dirty_rect = None
 
-        output = self.background_image.copy()
+            if self.output is not None and self.output.shape == self.background_image.shape:
+                self.output[...] = self.background_image
+            else:
+                self.output = None
 
         x1 = x_offset
         y1 = y_offset
         x2 = x1 + frame_width
         y2 = y1 + frame_height
 
-        if 'mask' in kwargs:
-            mask = kwargs['mask']
-            inv_mask = cv2.bitwise_not(mask)
-
-            cropped_background = self.background_image[y1:y2, x1:x2, :].copy()
-            cropped_background = cv2.bitwise_and(cropped_background, cropped_background, mask=inv_mask)
+        if self.output is None:
+            self.output = self.background_image.copy()
+        elif self.dirty_rect is not None and (self.dirty_rect != (x1, y1, x2, y2) or ctx.mask is not None):
+            dirty_x1, dirty_y1, dirty_x2, dirty_y2 = self.dirty_rect
+            self.output[dirty_y1:dirty_y2, dirty_x1:dirty_x2, :] = self.background_image[dirty_y1:dirty_y2, dirty_x1:dirty_x2, :]
 
-            rounded_input = cv2.bitwise_and(input, input, mask=mask)
-            blended = cv2.add(cropped_background, rounded_input)
-
-            output[y1:y2, x1:x2, :] = blended
+        roi = self.output[y1:y2, x1:x2, :]
+        if ctx.mask is not None:
+            # Masked-out pixels keep the background restored above
+            cv2.copyTo(input, ctx.mask, roi)
         else:
-            output[y1:y2, x1:x2, :] = input
+            roi[...] = input
+            if ctx.corner_masks is not None:
+                self._restore_corners(ctx.corner_masks, x1, y1, x2, y2)
+
+        self.dirty_rect = (x1, y1, x2, y2)
 
-        if 'shadow_mask' in kwargs:
+        if ctx.shadow_mask is not None:
             pass
 
-        kwargs['input'] = output
-        return kwargs
\ No newline at end of file
+        ctx.input = self.output
+        return ctx
\ No newline at end of file
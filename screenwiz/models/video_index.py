@@ -0,0 +1,145 @@
+import os
+import struct
+
+import cv2
+import numpy as np
+
+
+class VideoIndex:
+    """Presentation timestamps and keyframe positions of every video frame.
+
+    The index is built once by scanning the packets of the video without
+    decoding them and is stored in a binary sidecar file next to the video:
+
+        header     magic, version, video file size and mtime, frame and
+                   keyframe counts (see HEADER_FORMAT)
+        timestamps float64 per frame, in seconds, in presentation order
+        keyframes  uint32 per keyframe, frame indices in ascending order
+    """
+    MAGIC = b'SWIDX'
+    VERSION = 1
+    HEADER_FORMAT = '<5sBQqII'
+    SIDECAR_EXTENSION = '.swidx'
+
+    def __init__(self, timestamps, keyframes):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.uint32)
+        if len(self.keyframes) == 0 or self.keyframes[0] != 0:
+            # Decoding always starts at the first frame
+            self.keyframes = np.concatenate([np.zeros(1, dtype=np.uint32), self.keyframes])
+
+        self.num_frames = len(self.timestamps)
+        self.start_time = self.timestamps[0]
+
+        frame_durations = np.diff(self.timestamps)
+        last_frame_duration = np.median(frame_durations) if len(frame_durations) else 0
+        self.duration = self.timestamps[-1] - self.start_time + last_frame_duration
+        self.fps = self.num_frames / self.duration if self.duration > 0 else 0
+
+    @classmethod
+    def sidecar_path(cls, video_path):
+        return f'{video_path}{cls.SIDECAR_EXTENSION}'
+
+    @classmethod
+    def load_or_build(cls, video_path):
+        """Load the index of a video from its sidecar, scanning the video if needed.
+
+        Returns None if the video cannot be scanned.
+        """
+        sidecar_path = cls.sidecar_path(video_path)
+        try:
+            return cls.load(sidecar_path, video_path)
+        except (OSError, ValueError, struct.error):
+            pass
+
+        index = cls.scan(video_path)
+        if index is not None:
+            try:
+                index.save(sidecar_path, video_path)
+            except OSError:
+                # The sidecar is only an optimization
+                pass
+
+        return index
+
+    @classmethod
+    def scan(cls, video_path):
+        # Read the raw packets, the decoder is never run
+        video_capture = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        if not video_capture.isOpened():
+            return
+
+        timestamps = []
+        is_keyframe = []
+        while video_capture.grab():
+            timestamps.append(video_capture.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+            is_keyframe.append(video_capture.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) != 0)
+
+        video_capture.release()
+        if not timestamps:
+            return
+
+        # Packets come in decoding order, frames are indexed in presentation order
+        timestamps = np.array(timestamps, dtype=np.float64)
+        order = np.argsort(timestamps, kind='stable')
+        frame_indices = np.empty(len(order), dtype=np.int64)
+        frame_indices[order] = np.arange(len(order))
+        keyframes = np.sort(frame_indices[np.array(is_keyframe)])
+
+        return cls(timestamps[order], keyframes)
+
+    @classmethod
+    def load(cls, sidecar_path, video_path):
+        stat = os.stat(video_path)
+        with open(sidecar_path, 'rb') as file:
+            header = file.read(struct.calcsize(cls.HEADER_FORMAT))
+            magic, version, file_size, mtime_ns, num_frames, num_keyframes = struct.unpack(cls.HEADER_FORMAT, header)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError('Invalid video index file.')
+            if file_size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                raise ValueError('Outdated video index file.')
+
+            timestamps = np.fromfile(file, dtype='<f8', count=num_frames)
+            keyframes = np.fromfile(file, dtype='<u4', count=num_keyframes)
+
+        if len(timestamps) != num_frames or len(keyframes) != num_keyframes or num_frames == 0:
+            raise ValueError('Truncated video index file.')
+
+        return cls(timestamps, keyframes)
+
+    def save(self, sidecar_path, video_path):
+        stat = os.stat(video_path)
+        header = struct.pack(
+            self.HEADER_FORMAT, self.MAGIC, self.VERSION, stat.st_size, stat.st_mtime_ns,
+            self.num_frames, len(self.keyframes))
+
+        with open(sidecar_path, 'wb') as file:
+            file.write(header)
+            file.write(self.timestamps.astype('<f8').tobytes())
+            file.write(self.keyframes.astype('<u4').tobytes())
+
+    def keyframe_before(self, frame_index):
+        """Return the last keyframe at or before the given frame."""
+        index = np.searchsorted(self.keyframes, frame_index, side='right') - 1
+        return int(self.keyframes[max(0, index)])
+
+    def frame_at_timestamp(self, timestamp):
+        """Return the frame shown at the given stream timestamp, in seconds."""
+        # Tolerate rounding in the timestamps reported by the capture
+        index = np.searchsorted(self.timestamps, timestamp + 1e-4, side='right') - 1
+        return int(max(0, index))
+
+    def frame_at(self, seconds):
+        """Return the frame shown at the given time from the start of the video."""
+        return self.frame_at_timestamp(self.start_time + seconds)
+
+    def time_of(self, frame_index):
+        """Return the time of the given frame from the start of the video."""
+        if frame_index >= self.num_frames:
+            return self.duration
+
+        return self.timestamps[max(0, frame_index)] - self.start_time
+
+    def frame_times(self):
+        """Return the time of every frame from the start of the video."""
+        return self.timestamps - self.start_time
@@ -0,0 +1,102 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+
+class DiskCache:
+    """Disk budget of the files ScreenWiz derives from videos and images.
+
+    Proxies, frame stores and wallpaper pyramid levels are kept in the temp
+    directory so they are reused the next time a file is opened. Together
+    they are bounded by max_bytes: when a new file is added, the least
+    recently used files are deleted until the rest fits. Files are marked as
+    used by touching them.
+    """
+    root = Path(tempfile.gettempdir()) / 'ScreenWiz'
+    kinds = ('proxy', 'frames', 'pyramid')
+    max_bytes = 8 * 1024 * 1024 * 1024
+
+    # Partial files are being written, unless they were left behind long ago
+    stale_partial_seconds = 24 * 60 * 60
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def path_for(cls, kind, source_path, tag, extension):
+        """Path of a file derived from source_path, a changed source gets a new path."""
+        stat = os.stat(source_path)
+        digest = hashlib.sha1(
+            f'{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+        return cls.root / kind / f'{Path(source_path).stem}-{digest[:16]}-{tag}{extension}'
+
+    @classmethod
+    def touch(cls, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @classmethod
+    def set_max_bytes(cls, max_bytes):
+        cls.max_bytes = max_bytes
+        cls.trim()
+
+    @classmethod
+    def trim(cls, keep=()):
+        """Delete the least recently used files until the cache fits its budget.
+
+        Files in keep are in use and never deleted.
+        """
+        keep = {os.path.abspath(path) for path in keep}
+        with cls._lock:
+            files = cls._files()
+            nbytes = sum(size for _, size, _ in files)
+
+            now = time.time()
+            for path, size, mtime in sorted(files, key=lambda file: file[2]):
+                if nbytes <= cls.max_bytes:
+                    break
+
+                if path in keep or ('.partial' in os.path.basename(path) and now - mtime < cls.stale_partial_seconds):
+                    continue
+
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Files still open can not be deleted on some systems
+                    continue
+
+                nbytes -= size
+
+    @classmethod
+    def cache_info(cls):
+        with cls._lock:
+            files = cls._files()
+
+        return {
+            'size': len(files),
+            'nbytes': sum(size for _, size, _ in files),
+            'max_nbytes': cls.max_bytes,
+        }
+
+    @classmethod
+    def _files(cls):
+        files = []
+        for kind in cls.kinds:
+            try:
+                entries = list(os.scandir(cls.root / kind))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files.append((os.path.abspath(entry.path), stat.st_size, stat.st_mtime))
+                except OSError:
+                    continue
+
+        return files
@@ -0,0 +1,197 @@
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from utils.disk_cache import DiskCache
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+REDUCED_READ_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def read_image_size(path):
+    """Read the (width, height) of a PNG or JPEG image from its header.
+
+    Returns None for other formats or unreadable files.
+    """
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(24)
+            if header[:8] == PNG_SIGNATURE:
+                return int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big')
+
+            if header[:2] != b'\xff\xd8':
+                return None
+
+            # Walk the JPEG markers up to the start of frame segment
+            file.seek(2)
+            while True:
+                marker = file.read(2)
+                if len(marker) < 2 or marker[0] != 0xff:
+                    return None
+
+                segment_length = int.from_bytes(file.read(2), 'big')
+                if 0xc0 <= marker[1] <= 0xcf and marker[1] not in (0xc4, 0xc8, 0xcc):
+                    segment = file.read(5)
+                    return int.from_bytes(segment[3:5], 'big'), int.from_bytes(segment[1:3], 'big')
+
+                file.seek(segment_length - 2, os.SEEK_CUR)
+    except OSError:
+        return None
+
+
+class ImageAssets:
+    """Process-wide LRU cache of decoded images and their resized variants.
+
+    Decoded images are keyed by (path, reduction) and resized variants by
+    (path, width, height). The cache is bounded by the total size of the
+    cached images in bytes and is shared by every transform in the process.
+
+    Images requested at a small size are decoded at a reduced resolution:
+    JPEGs are scaled by the decoder, other formats are read from a pyramid of
+    reduced copies kept on disk, which is built the first time a level is used.
+    """
+    max_bytes = 256 * 1024 * 1024
+    pyramid_dir = DiskCache.root / 'pyramid'
+
+    _images = OrderedDict()
+    _sizes = {}
+    _nbytes = 0
+    _hits = 0
+    _misses = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, path, width=None, height=None):
+        if width is None or height is None:
+            return cls._decode(path, 1)
+
+        key = (path, width, height)
+        image = cls._lookup(key)
+        if image is not None:
+            return image
+
+        image = cls._decode(path, cls._reduction(path, width, height))
+        if image.shape[1] != width or image.shape[0] != height:
+            image = cv2.resize(image, (width, height))
+
+        # Cached images are shared, nobody may draw on them
+        image.setflags(write=False)
+        cls._put(key, image)
+        return image
+
+    @classmethod
+    def _reduction(cls, path, width, height):
+        """Pick the largest decode reduction that still covers the target size."""
+        if path not in cls._sizes:
+            cls._sizes[path] = read_image_size(path)
+
+        size = cls._sizes[path]
+        if size is None:
+            return 1
+
+        image_width, image_height = size
+        for reduction in (8, 4, 2):
+            if image_width // reduction >= width and image_height // reduction >= height:
+                return reduction
+
+        return 1
+
+    @classmethod
+    def _decode(cls, path, reduction):
+        key = (path, reduction)
+        image = cls._lookup(key)
+        if image is not None:
+            return image
+
+        if reduction == 1:
+            image = cv2.imread(path)
+        elif path.lower().endswith(JPEG_EXTENSIONS):
+            image = cv2.imread(path, REDUCED_READ_FLAGS[reduction])
+        else:
+            image = cls._read_pyramid_level(path, reduction)
+
+        if image is None:
+            raise Exception(f'Could not read image: {path}')
+
+        image.setflags(write=False)
+        cls._put(key, image)
+        return image
+
+    @classmethod
+    def _read_pyramid_level(cls, path, reduction):
+        level_path = DiskCache.path_for('pyramid', path, reduction, '.png')
+
+        if level_path.exists():
+            image = cv2.imread(str(level_path))
+            if image is not None:
+                DiskCache.touch(level_path)
+                return image
+
+        image = cv2.imread(path, REDUCED_READ_FLAGS[reduction])
+        if image is not None:
+            try:
+                cls.pyramid_dir.mkdir(parents=True, exist_ok=True)
+                cv2.imwrite(str(level_path), image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+                DiskCache.trim(keep=[level_path])
+            except (OSError, cv2.error):
+                # The pyramid is only an optimization
+                pass
+
+        return image
+
+    @classmethod
+    def _lookup(cls, key):
+        with cls._lock:
+            image = cls._images.get(key)
+            if image is not None:
+                cls._images.move_to_end(key)
+                cls._hits += 1
+                return image
+
+            cls._misses += 1
+
+    @classmethod
+    def _put(cls, key, image):
+        with cls._lock:
+            if key in cls._images:
+                return
+
+            cls._images[key] = image
+            cls._nbytes += image.nbytes
+            while cls._nbytes > cls.max_bytes and len(cls._images) > 1:
+                _, evicted = cls._images.popitem(last=False)
+                cls._nbytes -= evicted.nbytes
+
+    @classmethod
+    def set_max_bytes(cls, max_bytes):
+        with cls._lock:
+            cls.max_bytes = max_bytes
+            while cls._nbytes > cls.max_bytes and cls._images:
+                _, evicted = cls._images.popitem(last=False)
+                cls._nbytes -= evicted.nbytes
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._images.clear()
+            cls._nbytes = 0
+
+    @classmethod
+    def cache_info(cls):
+        with cls._lock:
+            return {
+                'hits': cls._hits,
+                'misses': cls._misses,
+                'size': len(cls._images),
+                'nbytes': cls._nbytes,
+                'max_nbytes': cls.max_bytes,
+            }
@@ -1,3 +1,6 @@
+import time
+import threading
+
 import numpy as np
 from PySide6.QtCore import QObject, Signal, QThread
 from config import config
@@ -19,6 +22,9 @@ class StudioViewModel(QObject):
     # Slider
     on_timeslider_position_changed = Signal(int)
 
+    # Playback
+    on_dropped_frames_changed = Signal(int)
+
     # Zoom tracks
     on_zoom_tracks_changed = Signal(tuple)
     zoom_track_selected = Signal(int)
@@ -29,8 +35,9 @@ class StudioViewModel(QObject):
         self.model = model
 
         self.video_thread = VideoThread(self.model)
-        self.video_thread.on_frame_ready.connect(self.on_frame_changed)
+        self.video_thread.on_frame_ready.connect(self.deliver_frame)
         self.video_thread.on_timeslider_position_changed.connect(self.on_timeslider_position_changed)
+        self.video_thread.on_dropped_frames_changed.connect(self.on_dropped_frames_changed)
 
     def load(self):
         # Emit a video length changed signal
@@ -75,6 +82,22 @@ class StudioViewModel(QObject):
             self.on_playing_changed.emit(True)
             self.video_thread.start()  # Correctly start the thread
 
+    def set_preview_size(self, width, height):
+        # Frames are rendered at the size they are displayed at
+        self.model.set_preview_size(width, height)
+
+        if not self.video_thread.is_running():
+            self.current_frame()
+
+    def deliver_frame(self):
+        # Paint the newest frame rendered by the video thread
+        frame = self.video_thread.frame_mailbox.take()
+        if frame is not None:
+            self.on_frame_changed.emit(frame)
+
+    def frame_delivery_info(self):
+        return self.video_thread.frame_mailbox.mailbox_info()
+
     def next_frame(self):
         # Grab next frame and emit a frame changed signal
         frame = self.model.next_frame()
@@ -83,7 +106,7 @@ class StudioViewModel(QObject):
         # Calculate the desired position of the time slider and emit a signal
         pixels_per_second = self.model.pixels_per_second
         frame_index = self.model.current_frame_index()
-        x_pos = frame_index / self.model.fps * pixels_per_second
+        x_pos = self.model.time_of(frame_index) * pixels_per_second
         self.on_timeslider_position_changed.emit(x_pos)
 
     def prev_frame(self):
@@ -94,7 +117,7 @@ class StudioViewModel(QObject):
         # Calculate the desired position of the time slider and emit a signal
         pixels_per_second = self.model.pixels_per_second
         frame_index = self.model.current_frame_index()
-        x_pos = frame_index / self.model.fps * pixels_per_second
+        x_pos = self.model.time_of(frame_index) * pixels_per_second
         self.on_timeslider_position_changed.emit(x_pos)
 
     def current_frame(self):
@@ -108,6 +131,9 @@ class StudioViewModel(QObject):
     def fps(self):
         return self.model.fps
 
+    def time_of(self, frame_index):
+        return self.model.time_of(frame_index)
+
     def update_frame_based_on_position(self, x_pos):
         is_running = False
         if self.video_thread.is_running():
@@ -115,7 +141,7 @@ class StudioViewModel(QObject):
             self.video_thread.stop()
 
         pixels_per_second = self.model.pixels_per_second
-        frame_index = int(x_pos / pixels_per_second * self.model.fps)
+        frame_index = self.model.frame_at(x_pos / pixels_per_second)
         self.read_frame(frame_index)
 
         if is_running:
@@ -127,7 +153,7 @@ class StudioViewModel(QObject):
     def update_zoom_tracks(self, data):
         index, x_pos, width = data
         pixels_per_second = self.model.pixels_per_second
-        frame_index = x_pos / pixels_per_second * self.model.fps
+        frame_index = self.model.frame_at(x_pos / pixels_per_second)
         duration = width / pixels_per_second
 
         updated_data = {'index': index, 'frame_index': frame_index, 'duration': duration, 'x_pos': x_pos, 'width': width}
@@ -138,7 +164,7 @@ class StudioViewModel(QObject):
     def insert_zoom_track(self, data):
         x_pos, width = data
         pixels_per_second = self.model.pixels_per_second
-        frame_index = x_pos / pixels_per_second * self.model.fps
+        frame_index = self.model.frame_at(x_pos / pixels_per_second)
         duration = width / pixels_per_second
 
         updated_data = {'x': 0.5, 'y': 0.5, 'frame_index': frame_index, 'duration': duration, 'x_pos': x_pos, 'width': width}
@@ -166,31 +192,115 @@ class StudioViewModel(QObject):
         return self.model.pixels_per_second
 
 
+class FrameMailbox:
+    """Single-slot mailbox passing the newest rendered frame to the GUI thread.
+
+    The render thread posts frames and the GUI thread takes the newest one.
+    A frame replaced before it was taken is never painted and is counted as
+    skipped.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frame = None
+        self.posted = 0
+        self.delivered = 0
+        self.skipped = 0
+
+    def post(self, frame):
+        """Put a frame in the slot, returns whether the slot was empty."""
+        with self.lock:
+            self.posted += 1
+            was_empty = self.frame is None
+            if not was_empty:
+                self.skipped += 1
+
+            self.frame = frame
+            return was_empty
+
+    def take(self):
+        with self.lock:
+            frame, self.frame = self.frame, None
+            if frame is not None:
+                self.delivered += 1
+
+            return frame
+
+    def reset(self):
+        with self.lock:
+            self.frame = None
+            self.posted = 0
+            self.delivered = 0
+            self.skipped = 0
+
+    def mailbox_info(self):
+        with self.lock:
+            return {
+                'posted': self.posted,
+                'delivered': self.delivered,
+                'skipped': self.skipped,
+            }
+
+
 class VideoThread(QThread):
-    on_frame_ready = Signal(np.ndarray)
+    # A frame is waiting in the mailbox, only emitted when it was empty
+    on_frame_ready = Signal()
     on_timeslider_position_changed = Signal(int)
     on_playing_changed = Signal(bool)
+    on_dropped_frames_changed = Signal(int)
 
     def __init__(self, model):
         super().__init__()
         self.model = model
         self._running = False
+        self.dropped_frames = 0
+        self.frame_mailbox = FrameMailbox()
 
     def run(self):
         self._running = True
-        while self._running:
-            frame = self.model.next_frame()
-            if frame is None:
-                break
+        self.dropped_frames = 0
+        self.frame_mailbox.reset()
+        self.on_dropped_frames_changed.emit(self.dropped_frames)
 
-            frame_index = self.model.current_frame_index()
-            self.on_frame_ready.emit(frame)
-
-            pixels_per_second = 200
-            x_pos = frame_index / self.model.fps * pixels_per_second
-            self.on_timeslider_position_changed.emit(x_pos)
-
-            self.msleep(20)  # 50 frames per second
+        # Frames are shown when they are due on a monotonic clock started at
+        # the playhead, frames that are already late are skipped
+        pixels_per_second = self.model.pixels_per_second
+        start_time = self.model.time_of(self.model.current_frame_index())
+        clock_start = time.monotonic()
+
+        self.model.start_read_ahead()
+        try:
+            while self._running:
+                playhead = start_time + time.monotonic() - clock_start
+                if playhead >= self.model.video_len:
+                    break
+
+                next_frame_index = self.model.current_frame_index()
+                due_frame_index = self.model.frame_at(playhead)
+                if due_frame_index < next_frame_index:
+                    # Ahead of the clock, wait until the next frame is due
+                    wait = self.model.time_of(next_frame_index) - playhead
+                    self.msleep(max(1, int(wait * 1000)))
+                    continue
+
+                if due_frame_index > next_frame_index:
+                    self.dropped_frames += due_frame_index - next_frame_index
+                    self.on_dropped_frames_changed.emit(self.dropped_frames)
+
+                frame = self.model.read(due_frame_index + 1)
+                if frame is None:
+                    break
+
+                frame_index = self.model.current_frame_index()
+
+                # Frames the GUI thread has not painted yet are replaced,
+                # so signals never pile up behind a slow GUI
+                if self.frame_mailbox.post(frame):
+                    self.on_frame_ready.emit()
+
+                x_pos = self.model.time_of(frame_index) * pixels_per_second
+                self.on_timeslider_position_changed.emit(x_pos)
+        finally:
+            self.model.stop_read_ahead()
 
     def stop(self):
         self._running = False
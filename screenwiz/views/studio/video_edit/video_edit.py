@@ -92,7 +92,7 @@ class VideoEdit(QWidget):
         self.content_widget.setFixedWidth(new_width)
 
     def update_zoom_tracks(self, zoom_track_data):
-        fps = AppContext.get('view_model').fps()
+        view_model = AppContext.get('view_model')
         pixels_per_second = AppContext.get('view_model').get_pixels_per_second()
 
         new_zoom_track_data = []
@@ -128,7 +128,7 @@ class VideoEdit(QWidget):
             if 'x_pos' in item:
                 x_pos = item['x_pos']
             else:
-                x_pos = int(frame_index / fps * pixels_per_second)
+                x_pos = int(view_model.time_of(frame_index) * pixels_per_second)
             size = QSize(width, self.zoom_track_config['height'])
 
             # Calculate the drag range
@@ -138,7 +138,7 @@ class VideoEdit(QWidget):
                 if 'x_pos' in prev_zoom_track:
                     prev_zoom_track_x = prev_zoom_track['x_pos']
                 else:
-                    prev_zoom_track_x = int(prev_zoom_track['frame_index'] / fps * pixels_per_second)
+                    prev_zoom_track_x = int(view_model.time_of(prev_zoom_track['frame_index']) * pixels_per_second)
 
                 if 'width' in prev_zoom_track:
                     prev_zoom_track_width = prev_zoom_track['width']
@@ -152,7 +152,7 @@ class VideoEdit(QWidget):
                 if 'x_pos' in next_zoom_track:
                     geometry_max_x = next_zoom_track['x_pos']
                 else:
-                    geometry_max_x = int(next_zoom_track['frame_index'] / fps * pixels_per_second)
+                    geometry_max_x = int(view_model.time_of(next_zoom_track['frame_index']) * pixels_per_second)
             else:
                 geometry_max_x = 1e6
 
@@ -188,7 +188,7 @@ class VideoEdit(QWidget):
             mouse_area.deleteLater()
 
         self.mouse_areas = []
-        fps = AppContext.get('view_model').fps()
+        view_model = AppContext.get('view_model')
 
         new_zoom_track_data = []
         for index, item in enumerate(zoom_track_data):
@@ -215,7 +215,7 @@ class VideoEdit(QWidget):
             if 'x_pos' in item:
                 x_pos = item['x_pos']
             else:
-                x_pos = int(frame_index / fps * pixels_per_second)
+                x_pos = int(view_model.time_of(frame_index) * pixels_per_second)
             # size = QSize(width, 60)
 
             # x_pos = int(frame_index / fps * pixels_per_second)
@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSizePolicy
 from PySide6.QtGui import QPixmap, QImage
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 
 from views.widgets.button import SWButton
 from views.widgets.aspect_ratio_image import AspectRatioImage
@@ -52,6 +52,12 @@ class FramePreview(QWidget):
 
         self.init_ui()
 
+        # Frames are rendered for the preview size once resizing settles
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(100)
+        self.resize_timer.timeout.connect(self.update_preview_size)
+
         # Grab and display first frame
         AppContext.get('view_model').current_frame()
 
@@ -77,15 +83,34 @@ class FramePreview(QWidget):
             height, width, channels = self.frame.shape
             image = QImage(self.frame.data, width, height, width * channels, QImage.Format.Format_BGR888)
             pixmap = QPixmap.fromImage(image)
-            self.frame_label.setPixmap(pixmap.scaled(
-                self.frame_label.size(),
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            ))
+
+            # Frames rendered for the current preview size fit the label in
+            # device pixels already, others are scaled until the next frame
+            device_pixel_ratio = self.frame_label.devicePixelRatioF()
+            label_size = self.frame_label.size() * device_pixel_ratio
+            label_width, label_height = label_size.width(), label_size.height()
+            fits = width <= label_width and height <= label_height
+            fills = width >= label_width - 2 or height >= label_height - 2
+            if not (fits and fills):
+                pixmap = pixmap.scaled(
+                    label_size,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation
+                )
+
+            pixmap.setDevicePixelRatio(device_pixel_ratio)
+            self.frame_label.setPixmap(pixmap)
+
+    def update_preview_size(self):
+        device_pixel_ratio = self.frame_label.devicePixelRatioF()
+        size = self.frame_label.size()
+        AppContext.get('view_model').set_preview_size(
+            round(size.width() * device_pixel_ratio), round(size.height() * device_pixel_ratio))
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
         self.update()  # Ensure the frame_label is updated with the new size
+        self.resize_timer.start()
 
 
 class VideoTopToolBar(QWidget):
@@ -0,0 +1,40 @@
+import os
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+SCREENWIZ_DIR = Path(__file__).resolve().parent.parent / 'screenwiz'
+sys.path.insert(0, str(SCREENWIZ_DIR))
+
+# The config reads its theme files relative to the working directory, the
+# app runs from screenwiz/
+os.chdir(SCREENWIZ_DIR)
+
+
+@pytest.fixture(scope='session')
+def clip(tmp_path_factory):
+    """A short video with several keyframes, and its frames decoded sequentially."""
+    path = str(tmp_path_factory.mktemp('video') / 'clip.mp4')
+
+    # MPEG-4 Part 2 starts a new group of pictures every 12 frames or so
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 96))
+    for i in range(90):
+        frame = np.full((96, 160, 3), i * 7 % 256, dtype=np.uint8)
+        cv2.rectangle(frame, (i, 10), (i + 30, 50), (0, 0, 255), -1)
+        cv2.putText(frame, str(i), (5, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+
+    video_capture = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = video_capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    video_capture.release()
+
+    return path, frames
@@ -0,0 +1,69 @@
+import random
+import threading
+
+import numpy as np
+
+from models.decoder_pool import Decoder, DecoderPool
+from models.video_index import VideoIndex
+
+
+def test_index_maps_frames_and_times(clip):
+    path, frames = clip
+    index = VideoIndex.scan(path)
+
+    assert index.num_frames == len(frames)
+    assert index.keyframes[0] == 0 and len(index.keyframes) > 3
+    for frame_index in range(len(frames)):
+        assert index.frame_at(index.time_of(frame_index)) == frame_index
+        assert index.keyframe_before(frame_index) <= frame_index
+
+
+def test_index_sidecar_round_trip(clip):
+    path, _ = clip
+    index = VideoIndex.load_or_build(path)
+    loaded = VideoIndex.load(VideoIndex.sidecar_path(path), path)
+
+    assert np.array_equal(loaded.timestamps, index.timestamps)
+    assert np.array_equal(loaded.keyframes, index.keyframes)
+
+
+def test_decoder_seeks_exactly(clip):
+    path, frames = clip
+    decoder = Decoder(path, VideoIndex.load_or_build(path))
+
+    # Random, backward and short forward reads, seeking to keyframes or grabbing
+    rng = random.Random(0)
+    targets = [rng.randrange(len(frames)) for _ in range(60)]
+    targets += list(range(len(frames) - 1, -1, -7)) + [3, 5, 9, 30, 31, 47]
+    for target in targets:
+        assert np.array_equal(decoder.read(target), frames[target]), target
+
+    assert decoder.read(len(frames)) is None
+    decoder.release()
+
+
+def test_decoder_pool_reads_exactly(clip):
+    path, frames = clip
+    pool = DecoderPool(path, VideoIndex.load_or_build(path), size=3)
+
+    # Interleaved streams keep their own decoders
+    for i in range(40):
+        for base in (0, 45):
+            assert np.array_equal(pool.read(base + i), frames[base + i])
+
+    errors = []
+
+    def read_range(start):
+        for target in range(start, min(start + 40, len(frames))):
+            if not np.array_equal(pool.read(target), frames[target]):
+                errors.append(target)
+
+    threads = [threading.Thread(target=read_range, args=(start,)) for start in (0, 30, 60)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert pool.pool_info()['size'] <= 3
+    pool.release()
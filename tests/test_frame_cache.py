@@ -0,0 +1,82 @@
+import numpy as np
+
+from models.frame_cache import FrameCache
+from models.transforms import Zoom
+
+
+def _frame(value):
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+
+def _zoom_factors(zoom, num_frames):
+    zoom_factors = np.ones(num_frames)
+    zoom_factors[:len(zoom.zoom_factors)] = zoom.zoom_factors[:num_frames]
+    return zoom_factors
+
+
+def test_changed_frames_are_the_frames_zoomed_differently():
+    zoom = Zoom(click_data=[{'x': 0.5, 'y': 0.5, 'frame_index': 10, 'duration': 1.0}], fps=30)
+    old_zoom_factors, old_positions = zoom.zoom_factors, zoom.positions
+    old = _zoom_factors(zoom, 100)
+
+    zoom.update(click_data=[{'x': 0.5, 'y': 0.5, 'frame_index': 40, 'duration': 1.0}])
+    changed = zoom.changed_frames(old_zoom_factors, old_positions)
+
+    assert changed == np.flatnonzero(old != _zoom_factors(zoom, 100)).tolist()
+    assert min(changed) >= 10 and max(changed) < 70
+
+
+def test_changed_frames_of_a_moved_zoom_position():
+    zoom = Zoom(click_data=[{'x': 0.5, 'y': 0.5, 'frame_index': 10, 'duration': 1.0}], fps=30)
+    old_zoom_factors, old_positions = zoom.zoom_factors, zoom.positions
+
+    # Only zoomed frames look different at another position
+    zoom.update(click_data=[{'x': 0.1, 'y': 0.1, 'frame_index': 10, 'duration': 1.0}])
+    changed = zoom.changed_frames(old_zoom_factors, old_positions)
+
+    assert changed == np.flatnonzero(zoom.zoom_factors != 1).tolist()
+
+
+def test_invalidate_drops_changed_frames_for_every_fingerprint():
+    frame_cache = FrameCache()
+    for frame_index in range(100):
+        frame_cache.put(frame_index, ('a',), _frame(1))
+        frame_cache.put(frame_index, ('b',), _frame(2))
+
+    zoom = Zoom(click_data=[{'x': 0.5, 'y': 0.5, 'frame_index': 10, 'duration': 1.0}], fps=30)
+    old_zoom_factors, old_positions = zoom.zoom_factors, zoom.positions
+    zoom.update(click_data=[{'x': 0.5, 'y': 0.5, 'frame_index': 40, 'duration': 1.0}])
+    changed = set(zoom.changed_frames(old_zoom_factors, old_positions))
+    frame_cache.invalidate(changed)
+
+    for frame_index in range(100):
+        for fingerprint in (('a',), ('b',)):
+            cached = frame_cache.get(frame_index, fingerprint) is not None
+            assert cached == (frame_index not in changed)
+
+    assert frame_cache.cache_info()['nbytes'] == (100 - len(changed)) * 2 * _frame(0).nbytes
+
+
+def test_frames_rendered_before_an_invalidation_are_not_stored():
+    frame_cache = FrameCache()
+    generation = frame_cache.generation
+
+    # The GUI thread changes the zoom while the frame is being rendered
+    frame_cache.invalidate([5])
+    frame_cache.put(5, ('a',), _frame(1), generation)
+    assert frame_cache.get(5, ('a',)) is None
+
+    frame_cache.put(5, ('a',), _frame(1), frame_cache.generation)
+    assert frame_cache.get(5, ('a',)) is not None
+
+
+def test_frames_are_evicted_least_recently_used_first():
+    frame_cache = FrameCache(max_bytes=3 * _frame(0).nbytes)
+    for frame_index in range(3):
+        frame_cache.put(frame_index, (), _frame(frame_index))
+
+    frame_cache.get(0, ())
+    frame_cache.put(3, (), _frame(3))
+
+    assert frame_cache.get(1, ()) is None
+    assert all(frame_cache.get(frame_index, ()) is not None for frame_index in (0, 2, 3))
@@ -0,0 +1,44 @@
+import numpy as np
+
+from models.studio_model import VideoController
+
+
+def test_sequential_reads_do_not_seek(clip):
+    path, frames = clip
+    video_controller = VideoController(path)
+
+    # Explicit indices, as the studio passes them when stepping forward
+    for frame_index in range(len(frames)):
+        assert np.array_equal(video_controller.read(frame_index + 1), frames[frame_index])
+        assert video_controller.frame_index == frame_index + 1
+
+    assert video_controller.read() is None
+    assert video_controller.decoders.pool_info()['seeks'] == 0
+    video_controller.decoders.release()
+
+
+def test_forward_gaps_within_a_gop_are_grabbed(clip):
+    path, frames = clip
+    video_controller = VideoController(path)
+    keyframes = video_controller.index.keyframes.tolist() + [len(frames)]
+
+    # The first and last frame of every group of pictures
+    targets = sorted(set(keyframes[:-1]) | {keyframe - 1 for keyframe in keyframes[1:]})
+    for target in targets:
+        assert np.array_equal(video_controller.read(target + 1), frames[target])
+
+    assert video_controller.decoders.pool_info()['seeks'] == 0
+    video_controller.decoders.release()
+
+
+def test_stepping_back_is_exact(clip):
+    path, frames = clip
+    video_controller = VideoController(path, backward_cache_bytes=64 * 1024 * 1024)
+    video_controller.read(len(frames))
+
+    # Like StudioModel.prev_frame, from the end of the video to its start
+    for frame_index in range(len(frames) - 2, -1, -1):
+        frame = video_controller.read(max(0, video_controller.frame_index - 1))
+        assert np.array_equal(frame, frames[frame_index]), frame_index
+
+    video_controller.decoders.release()
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'screenwiz'))
+
+from models.transforms import Zoom
+
+
+def _high_frequency_images():
+    noise = np.random.default_rng(0).integers(0, 256, (360, 640, 3), dtype=np.uint8)
+
+    checkerboard = np.zeros((360, 640, 3), dtype=np.uint8)
+    checkerboard[::2] = 255
+    checkerboard[:, ::2] ^= 255
+
+    return noise, checkerboard
+
+
+def test_crop_and_scale_matches_resize_within_tolerance():
+    # warpAffine snaps sample positions to 1/32 pixel, so on sharp edges
+    # it differs from cv2.resize by up to 255 / 32 levels
+    for image in _high_frequency_images():
+        height, width = image.shape[:2]
+        for zoom_factor in np.linspace(1.01, 2.0, 25):
+            new_width, new_height = int(width * zoom_factor), int(height * zoom_factor)
+            resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+            for x, y in ((0, 0), ((new_width - width) // 2, (new_height - height) // 2),
+                         (new_width - width, new_height - height)):
+                cropped = Zoom._crop_and_scale(image, new_width, new_height, x, y, width, height)
+                diff = np.abs(cropped.astype(np.int16) - resized[y:y + height, x:x + width])
+
+                assert cropped.shape == (height, width, 3)
+                assert diff.max() <= 8
+                assert diff.mean() <= 2